@@ -0,0 +1,79 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from metrics import REGISTRY
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    Immutable result of one successful read from a source.
+    value is whatever the source's read function returned (e.g. (pm25, pm10)).
+    """
+    value: Any
+    timestamp: float  # time.time() when the read completed
+    seq: int          # increments on every publish, lets readers spot new data
+
+
+class SourceWorker(threading.Thread):
+    """
+    Runs a blocking read function on its own thread and publishes the latest
+    good result as a Snapshot. The render loop only ever reads .snapshot,
+    which is a single attribute swap, so it never waits on hardware or network.
+
+    read_fn should return None when it has nothing new (timeout, bad frame...).
+    Exceptions are swallowed and treated the same way; the last good snapshot stays.
+
+    on_update(snapshot) is called from the worker thread, only when the value
+    actually changed, so it can be used to wake an event-driven render loop.
+    """
+
+    def __init__(self, name: str, read_fn: Callable[[], Any], interval: float = 1.0,
+                 on_update: Optional[Callable[["Snapshot"], None]] = None):
+        super().__init__(name=name, daemon=True)
+        self.read_fn = read_fn
+        self.interval = interval
+        self.on_update = on_update
+
+        self.snapshot: Optional[Snapshot] = None
+        self._seq = 0
+
+        self._read_time = REGISTRY.histogram(
+            "aq_source_read_seconds", "Time spent in one source read", labels={"source": name})
+        self._read_errors = REGISTRY.counter(
+            "aq_source_read_errors_total", "Source reads that raised", labels={"source": name})
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            t0 = time.perf_counter()
+            try:
+                value = self.read_fn()
+            except Exception:
+                value = None
+                self._read_errors.inc()
+            self._read_time.observe(time.perf_counter() - t0)
+
+            if value is not None:
+                prev = self.snapshot
+                self._seq += 1
+                snap = Snapshot(value, time.time(), self._seq)
+                self.snapshot = snap
+                changed = prev is None or prev.value != value
+                if changed and self.on_update is not None:
+                    try:
+                        self.on_update(snap)
+                    except Exception:
+                        pass
+
+            # keep a steady cadence; a slow read just shortens the wait
+            elapsed = time.monotonic() - started
+            self._stop_event.wait(max(0.0, self.interval - elapsed))
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop_event.set()
+        if timeout is not None:
+            self.join(timeout)
@@ -0,0 +1,462 @@
+import math
+from array import array
+from collections import deque
+from typing import Optional
+
+
+class RollingRegression:
+    """
+    Least-squares line over a sliding time window of (t, y) samples.
+
+    Samples live in a fixed-size ring and running sums (n, Σt, Σy, Σt², Σty)
+    are updated on every add/evict, so the slope is O(1) per sample and memory
+    never grows. Times are kept relative to an origin that is moved up (and
+    the sums recomputed) once per ring's worth of evictions, which keeps the
+    sums well conditioned without costing more than O(1) amortised.
+    """
+
+    def __init__(self, window_seconds: float, min_gap: float = 0.0, capacity: Optional[int] = None):
+        self.window_seconds = window_seconds
+        self.min_gap = min_gap
+        if capacity is None:
+            capacity = int(window_seconds / min_gap) + 2 if min_gap > 0 else 1024
+        self.capacity = capacity
+
+        self._t = array("d", [0.0] * capacity)
+        self._y = array("d", [0.0] * capacity)
+        self._head = 0   # next write slot
+        self._count = 0
+        self._origin = None
+        self._evictions = 0
+
+        self._st = self._sy = self._stt = self._sty = 0.0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _slot(self, i: int) -> int:
+        return (self._head - self._count + i) % self.capacity
+
+    def oldest(self):
+        if not self._count:
+            return None
+        k = self._slot(0)
+        return self._t[k] + self._origin, self._y[k]
+
+    def newest(self):
+        if not self._count:
+            return None
+        k = self._slot(self._count - 1)
+        return self._t[k] + self._origin, self._y[k]
+
+    def span(self) -> float:
+        """Seconds between the oldest and newest sample."""
+        if self._count < 2:
+            return 0.0
+        return self._t[self._slot(self._count - 1)] - self._t[self._slot(0)]
+
+    def _evict_oldest(self) -> None:
+        k = self._slot(0)
+        t, y = self._t[k], self._y[k]
+        self._st -= t
+        self._sy -= y
+        self._stt -= t * t
+        self._sty -= t * y
+        self._count -= 1
+
+        self._evictions += 1
+        if self._evictions >= self.capacity:
+            self._rebase()
+
+    def _rebase(self) -> None:
+        """Move the origin to the oldest sample and recompute sums from scratch."""
+        self._evictions = 0
+        if not self._count:
+            self._origin = None
+            self._st = self._sy = self._stt = self._sty = 0.0
+            return
+        shift = self._t[self._slot(0)]
+        self._origin += shift
+        st = sy = stt = sty = 0.0
+        for i in range(self._count):
+            k = self._slot(i)
+            t = self._t[k] - shift
+            y = self._y[k]
+            self._t[k] = t
+            st += t
+            sy += y
+            stt += t * t
+            sty += t * y
+        self._st, self._sy, self._stt, self._sty = st, sy, stt, sty
+
+    def add(self, t: float, y: float) -> bool:
+        """
+        Add a sample. Returns False if it was skipped by min_gap; samples that
+        have left the window are dropped either way, so slope() never covers
+        more than window_seconds back from the latest add().
+        """
+        cutoff = t - self.window_seconds
+        while self._count and self._t[self._slot(0)] + self._origin < cutoff:
+            self._evict_oldest()
+
+        if self._count and t - (self._t[self._slot(self._count - 1)] + self._origin) < self.min_gap:
+            return False
+
+        if self._count == self.capacity:  # ring full: drop the oldest
+            self._evict_oldest()
+        if self._origin is None:
+            self._origin = t
+
+        rt = t - self._origin
+        self._t[self._head] = rt
+        self._y[self._head] = y
+        self._head = (self._head + 1) % self.capacity
+        self._count += 1
+
+        self._st += rt
+        self._sy += y
+        self._stt += rt * rt
+        self._sty += rt * y
+        return True
+
+    def slope(self) -> Optional[float]:
+        """Units of y per second, or None with fewer than 2 samples."""
+        n = self._count
+        if n < 2:
+            return None
+        denom = n * self._stt - self._st * self._st
+        if denom <= 0:
+            return None
+        return (n * self._sty - self._st * self._sy) / denom
+
+
+# Met Office / WMO wording for the 3-hour pressure tendency (hPa per 3h)
+TENDENCY_BANDS = (
+    (0.1, "Steady"),
+    (1.6, "{dir} slowly"),
+    (3.6, "{dir}"),
+    (6.1, "{dir} quickly"),
+    (math.inf, "{dir} very rapidly"),
+)
+
+TENDENCY_SECONDS = 3 * 3600
+
+
+def classify_tendency(change_hpa: float) -> str:
+    """Standard barometric tendency term for a change over 3 hours."""
+    direction = "Rising" if change_hpa > 0 else "Falling"
+    a = abs(change_hpa)
+    for limit, text in TENDENCY_BANDS:
+        if a < limit:
+            return text.format(dir=direction)
+    return TENDENCY_BANDS[-1][1].format(dir=direction)
+
+
+class PressureTendency:
+    """
+    3-hour barometric tendency from a downsampled RollingRegression:
+    one sample every sample_gap seconds keeps it at ~40 slots regardless
+    of how often pressure is read.
+    """
+
+    def __init__(self, sample_gap: float = 300.0, min_span: float = 0.9 * TENDENCY_SECONDS):
+        self.min_span = min_span
+        self.window = RollingRegression(TENDENCY_SECONDS, min_gap=sample_gap)
+
+    def add(self, t: float, pressure_mb: float) -> bool:
+        return self.window.add(t, pressure_mb)
+
+    def change_3h(self) -> Optional[float]:
+        """Fitted pressure change over 3 hours, or None until the window has filled."""
+        if self.window.span() < self.min_span:
+            return None
+        s = self.window.slope()
+        return None if s is None else s * TENDENCY_SECONDS
+
+    def text(self) -> str:
+        change = self.change_3h()
+        if change is None:
+            return "3h: --"
+        return f"3h: {classify_tendency(change)} ({change:+.1f})"
+
+
+class WindowedStats:
+    """
+    Rolling mean / min / max over a time window, O(1) per sample.
+
+    The window is split into a fixed number of buckets; each bucket keeps a
+    sum and count, and a running total is adjusted as buckets enter and leave.
+    Min/max use monotonic deques of per-bucket extremes plus the open bucket.
+    Memory is fixed by the bucket count, whatever the sample rate.
+    """
+
+    def __init__(self, window_seconds: float, buckets: int = 60):
+        self.window_seconds = window_seconds
+        self.buckets = buckets
+        self.bucket_seconds = window_seconds / buckets
+
+        self._ids = array("q", [-1] * buckets)
+        self._sums = array("d", [0.0] * buckets)
+        self._counts = array("q", [0] * buckets)
+        self._total = 0.0
+        self._n = 0
+
+        self._cur = None  # id of the open bucket
+        self._cur_min = math.inf
+        self._cur_max = -math.inf
+        self._mins = deque()  # (bucket id, min), increasing values
+        self._maxs = deque()  # (bucket id, max), decreasing values
+
+    def _evict(self, slot: int) -> None:
+        self._total -= self._sums[slot]
+        self._n -= self._counts[slot]
+        self._sums[slot] = 0.0
+        self._counts[slot] = 0
+        self._ids[slot] = -1
+
+    def _advance(self, b: int) -> None:
+        cur = self._cur
+        if cur is not None and b <= cur:
+            return
+
+        # close the open bucket into the extreme deques
+        if cur is not None and self._cur_min != math.inf:
+            while self._mins and self._mins[-1][1] >= self._cur_min:
+                self._mins.pop()
+            self._mins.append((cur, self._cur_min))
+            while self._maxs and self._maxs[-1][1] <= self._cur_max:
+                self._maxs.pop()
+            self._maxs.append((cur, self._cur_max))
+        self._cur_min = math.inf
+        self._cur_max = -math.inf
+
+        # buckets cur+1..b reuse the slots of buckets that just left the window
+        oldest_kept = b - self.buckets + 1
+        if cur is not None:
+            for bid in range(max(cur + 1, oldest_kept), b + 1):
+                slot = bid % self.buckets
+                if self._ids[slot] != -1:
+                    self._evict(slot)
+        while self._mins and self._mins[0][0] < oldest_kept:
+            self._mins.popleft()
+        while self._maxs and self._maxs[0][0] < oldest_kept:
+            self._maxs.popleft()
+
+        slot = b % self.buckets
+        self._ids[slot] = b
+        self._cur = b
+
+    def add(self, t: float, v: float, n: int = 1) -> None:
+        """n > 1 adds v as the mean of n samples (e.g. a stored 1-minute rollup)."""
+        b = int(t // self.bucket_seconds)
+        self._advance(b)
+        if b != self._cur:
+            return  # older than the open bucket, ignore
+        slot = b % self.buckets
+        self._sums[slot] += v * n
+        self._counts[slot] += n
+        self._total += v * n
+        self._n += n
+        if v < self._cur_min:
+            self._cur_min = v
+        if v > self._cur_max:
+            self._cur_max = v
+
+    def expire(self, now: float) -> None:
+        """Age the window to `now` even if no samples have arrived."""
+        self._advance(int(now // self.bucket_seconds))
+
+    def __len__(self) -> int:
+        return self._n
+
+    def mean(self) -> Optional[float]:
+        return self._total / self._n if self._n else None
+
+    def min(self) -> Optional[float]:
+        m = min(self._mins[0][1] if self._mins else math.inf, self._cur_min)
+        return None if m == math.inf else m
+
+    def max(self) -> Optional[float]:
+        m = max(self._maxs[0][1] if self._maxs else -math.inf, self._cur_max)
+        return None if m == -math.inf else m
+
+
+# name -> (window seconds, buckets). 24h uses 15-minute buckets.
+PM_WINDOWS = {
+    "15m": (15 * 60, 60),
+    "1h": (3600, 60),
+    "24h": (86400, 96),
+}
+
+
+class PMAverages:
+    """WindowedStats for every PM channel and window in PM_WINDOWS."""
+
+    def __init__(self, kinds=("pm25", "pm10"), windows=PM_WINDOWS):
+        self.stats = {
+            kind: {name: WindowedStats(secs, buckets) for name, (secs, buckets) in windows.items()}
+            for kind in kinds
+        }
+
+    def add(self, t: float, kind: str, value: float, n: int = 1) -> None:
+        for w in self.stats[kind].values():
+            w.add(t, value, n)
+
+    def expire(self, now: float) -> None:
+        for per_kind in self.stats.values():
+            for w in per_kind.values():
+                w.expire(now)
+
+    def mean(self, kind: str, window: str) -> Optional[float]:
+        return self.stats[kind][window].mean()
+
+    def window(self, kind: str, window: str) -> WindowedStats:
+        return self.stats[kind][window]
+
+
+class RollingMedian:
+    """
+    Median and MAD of the last `window` samples, O(log n) per sample.
+
+    SDS011 values are whole tenths of a µg/m³ (0..999.9), so instead of a
+    sorted container the window is kept as counts on that grid in a Fenwick
+    tree: add/evict and the k-th smallest are each one walk of ~14 steps,
+    whatever the window size. Values off the grid are rounded/clamped onto it.
+    MAD is a binary search over the deviation using range counts (O(log² n)),
+    so only ask for it when you need it.
+    """
+
+    def __init__(self, window: int = 15, resolution: float = 0.1, max_value: float = 999.9):
+        self.window = window
+        self.resolution = resolution
+        self._per_unit = 1.0 / resolution  # dividing by this keeps 0.1 steps exact (10.6, not 10.600000000000001)
+        self.size = int(round(max_value / resolution)) + 1
+        self._tree = array("l", [0] * (self.size + 1))
+        self._top = 1 << (self.size.bit_length() - 1)
+        self._ring = array("l", [0] * window)
+        self._n = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _index(self, v: float) -> int:
+        return min(self.size - 1, max(0, int(round(v * self._per_unit))))
+
+    def _update(self, i: int, delta: int) -> None:
+        i += 1
+        tree, size = self._tree, self.size
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+
+    def _count_le(self, i: int) -> int:
+        """Samples at grid index <= i."""
+        if i < 0:
+            return 0
+        i = min(i, self.size - 1) + 1
+        tree = self._tree
+        n = 0
+        while i:
+            n += tree[i]
+            i -= i & -i
+        return n
+
+    def _kth(self, k: int) -> int:
+        """Grid index of the k-th smallest sample (1-based)."""
+        tree, size = self._tree, self.size
+        pos = 0
+        step = self._top
+        while step:
+            nxt = pos + step
+            if nxt <= size and tree[nxt] < k:
+                pos = nxt
+                k -= tree[nxt]
+            step >>= 1
+        return pos
+
+    def add(self, v: float) -> None:
+        i = self._index(v)
+        if self._n == self.window:
+            self._update(self._ring[self._next], -1)
+        else:
+            self._n += 1
+        self._ring[self._next] = i
+        self._next = (self._next + 1) % self.window
+        self._update(i, 1)
+
+    def _median2(self) -> int:
+        """Median in grid units, doubled (so even windows stay integral)."""
+        n = self._n
+        return self._kth((n + 1) // 2) + self._kth(n // 2 + 1)
+
+    def median(self) -> Optional[float]:
+        if not self._n:
+            return None
+        return self._median2() / (2 * self._per_unit)
+
+    def _deviation2(self, m2: int, k: int) -> int:
+        """k-th smallest |2x - m2| in grid units (doubled, like m2)."""
+        # smallest doubled distance d with at least k samples in |2x - m2| <= d
+        lo, hi = 0, 2 * self.size
+        while lo < hi:
+            d = (lo + hi) // 2
+            inside = self._count_le((m2 + d) // 2) - self._count_le(-((d - m2) // 2) - 1)
+            if inside >= k:
+                hi = d
+            else:
+                lo = d + 1
+        return lo
+
+    def mad(self) -> Optional[float]:
+        """
+        Median absolute deviation from the median (unscaled). For an even
+        window it is the mean of the two middle deviations, as for the median.
+        """
+        n = self._n
+        if not n:
+            return None
+        m2 = self._median2()
+        lower = self._deviation2(m2, (n + 1) // 2)
+        upper = lower if n % 2 else self._deviation2(m2, n // 2 + 1)
+        return (lower + upper) / (4 * self._per_unit)
+
+
+class SpikeFilter:
+    """
+    Hampel filter for one channel: a sample further than `threshold` scaled
+    MADs (and at least `min_delta`) from the rolling median of the previous
+    samples is replaced by that median.
+
+    Every raw sample still goes into the window, so a genuine step change is
+    passed through once it makes up half the window; a one-frame spike from
+    an insect or a burst of steam never is. min_delta stops a flat signal
+    (MAD 0) from turning every small wobble into a "spike", and means the
+    MAD, the expensive part, is only computed for suspicious samples.
+    """
+
+    MAD_SCALE = 1.4826  # MAD -> standard deviation for normally distributed noise
+
+    def __init__(self, window: int = 15, threshold: float = 4.0, min_delta: float = 5.0,
+                 min_samples: int = 5, **grid):
+        self.threshold = threshold
+        self.min_delta = min_delta
+        self.min_samples = min_samples
+        self.median = RollingMedian(window, **grid)
+        self.samples = 0
+        self.spikes = 0
+
+    def filter(self, v: Optional[float]) -> Optional[float]:
+        if v is None:
+            return None
+        self.samples += 1
+        window = self.median
+        out = v
+        if len(window) >= self.min_samples:
+            med = window.median()
+            dev = abs(v - med)
+            if dev > self.min_delta and dev > self.threshold * self.MAD_SCALE * window.mad():
+                out = med
+                self.spikes += 1
+        window.add(v)
+        return out
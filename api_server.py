@@ -0,0 +1,201 @@
+"""
+Small read-only HTTP/JSON API for other machines on the LAN.
+
+    GET /api                   channels, tiers, endpoints
+    GET /api/current           latest readings (what the display shows)
+    GET /api/history?channel=pm25&tier=1m&from=<epoch>&to=<epoch>&stat=mean&limit=1000
+                               one page of history; follow "next" for the rest
+
+Nothing here talks to the sensors. The display loop calls publish() once a
+second and the response body is serialised there, only when something
+changed; request threads just hand out the prepared bytes. History pages
+come straight from the mmap'd TimeSeriesStore and are cached per tier
+generation, so a room full of clients polling the same view every second
+costs one query per new record, and an unchanged page is a 304.
+"""
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from timeseries import STATS
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 5000
+CACHE_ENTRIES = 64
+
+
+def _json(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), allow_nan=False).encode()
+
+
+def _clean(v):
+    """NaN (missing sample) -> null, and don't leak float32 noise like 21.299999237."""
+    if v is None or math.isnan(v):
+        return None
+    return round(v, 2)
+
+
+class _Response:
+    __slots__ = ("body", "etag", "max_age")
+
+    def __init__(self, body: bytes, etag: str, max_age: int = 0):
+        self.body, self.etag, self.max_age = body, etag, max_age
+
+
+class ApiServer:
+    """
+    store: the TimeSeriesStore the display writes to (read here, never written).
+    Runs on daemon threads; start() / stop() from the owning process.
+    """
+
+    def __init__(self, store, host: str = "", port: int = 8080):
+        self.store = store
+        self.host = host
+        self.port = port
+
+        self._boot = f"{int(time.time()):x}"
+        self._gen = 0
+        self._current_values = None
+        self._current = _Response(_json({"timestamp": None, "readings": {}}), f'"{self._boot}-0"', 1)
+        self._index = _Response(_json({
+            "channels": list(store.channels),
+            "tiers": {name: {"bucket_seconds": store.bucket_seconds[name],
+                             "capacity": ring.capacity}
+                      for name, ring in store.tiers.items()},
+            "stats": list(STATS),
+            "endpoints": ["/api/current", "/api/history"],
+        }), f'"{self._boot}-index"', 3600)
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._server = None
+
+    # --- called from the display loop ---
+    def publish(self, timestamp: float, readings: dict, **extra) -> None:
+        """
+        readings: channel -> value/None. extra: anything else worth serving
+        (averages, tendency text...). Re-serialises only if something changed.
+        """
+        values = (readings, extra)
+        if values == self._current_values:
+            return
+        self._current_values = values
+        self._gen += 1
+        doc = {"timestamp": int(timestamp),
+               "readings": {k: (None if v is None else round(v, 2)) for k, v in readings.items()}}
+        doc.update(extra)
+        # swapping one reference is atomic; handlers never see a half-built response
+        self._current = _Response(_json(doc), f'"{self._boot}-{self._gen}"', 1)
+
+    # --- history ---
+    def history(self, query: dict) -> _Response:
+        """Raises ValueError/KeyError on a bad query (turned into a 400)."""
+        channel = query["channel"]
+        tier = query.get("tier", "raw")
+        stat = query.get("stat", "mean")
+        if channel not in self.store.channels:
+            raise ValueError(f"unknown channel {channel!r}")
+        if tier not in self.store.tiers or stat not in STATS:
+            raise ValueError("unknown tier or stat")
+
+        last = self.store.last_timestamp(tier)
+        t1 = int(query.get("to", (last or 0) + 1))
+        t0 = int(query.get("from", t1 - 3600))
+        limit = max(1, min(int(query.get("limit", DEFAULT_LIMIT)), MAX_LIMIT))
+
+        # the page only changes when its tier gains a record inside [t0, t1)
+        gen = min(last, t1 - 1) if last is not None else 0
+        key = (channel, tier, stat, t0, t1, limit)
+        with self._cache_lock:
+            hit = self._cache.get(key)
+            if hit is not None and hit[0] == gen:
+                self._cache.move_to_end(key)
+                return hit[1]
+
+        times, values = self.store.query(channel, t0, t1, tier=tier, stat=stat)
+        more = len(times) > limit
+        if more:
+            times, values = times[:limit], values[:limit]
+        doc = {
+            "channel": channel,
+            "tier": tier,
+            "stat": stat if self.store.bucket_seconds[tier] != 1 else "value",
+            "from": t0,
+            "to": t1,
+            "points": [[t, _clean(v)] for t, v in zip(times, values)],
+            "next": times[-1] + 1 if more else None,
+        }
+        # pages entirely in the past are immutable until the ring wraps
+        max_age = 60 if last is not None and t1 <= last else 1
+        resp = _Response(_json(doc), f'"{self._boot}-{tier}-{gen}-{hash(key) & 0xFFFFFFFF:x}"', max_age)
+
+        with self._cache_lock:
+            self._cache[key] = (gen, resp)
+            self._cache.move_to_end(key)
+            while len(self._cache) > CACHE_ENTRIES:
+                self._cache.popitem(last=False)
+        return resp
+
+    # --- HTTP ---
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                try:
+                    if url.path in ("/api", "/api/"):
+                        resp = api._index
+                    elif url.path == "/api/current":
+                        resp = api._current
+                    elif url.path == "/api/history":
+                        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                        resp = api.history(q)
+                    else:
+                        self.send_error(404)
+                        return
+                except (KeyError, ValueError) as e:
+                    self._send(400, _json({"error": str(e)}), None, 0)
+                    return
+                except Exception:
+                    self.send_error(500)
+                    return
+
+                if self.headers.get("If-None-Match") == resp.etag:
+                    self._send(304, b"", resp.etag, resp.max_age)
+                else:
+                    self._send(200, resp.body, resp.etag, resp.max_age)
+
+            def _send(self, code, body, etag, max_age):
+                self.send_response(code)
+                if code != 304:
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Cache-Control", f"max-age={max_age}")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="api-http", daemon=True).start()
+        return self._server
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Recompute the derived values (dew point, comfort, PM quality bands, pressure
+trend) over stored history, e.g. after changing thresholds in display_app.py.
+
+The dashboard works these out one scalar at a time as readings arrive; here
+the store is read in fixed-size chunks of records and each chunk is done
+with NumPy in one go. Rolling windows (the 1h PM band mean, the 30 minute
+pressure regression) carry the tail of the previous chunk over, so chunk
+boundaries don't show. Memory is bounded by the chunk size, whatever the
+length of the history.
+
+Results go to <store>/derived/<tier>.ring, one record per source record:
+
+    dew_point       C
+    comfort         index into display_app.COMFORT_LABELS
+    pm25_band       index into display_app.QUALITY_LABELS (on the AQ_BAND_WINDOW mean, as displayed)
+    pm10_band       "
+    pressure_slope  mb/h, least squares over the trend window
+    pressure_trend  index into display_app.PRESSURE_TREND_LABELS
+
+NaN where the inputs were missing (or too sparse for a trend). The file is
+built alongside and swapped in when complete. Rollup tiers use the bucket
+means; the pressure trend needs the raw or 1m tier (a 15m tier never has
+the 6 samples in 30 minutes that the display asks for).
+
+    python3 backfill.py                     # 1m tier of the main store
+    python3 backfill.py --tier raw --chunk 100000
+    python3 backfill.py --store ~/.local/share/airquality/devices/bme280.outdoor
+"""
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+
+import display_app as app
+from analytics import PM_WINDOWS
+from pipeline import DEVICE_CHANNELS, PRESSURE_HISTORY_SECONDS
+from timeseries import CHANNELS, STATS, RingFile, TimeSeriesStore
+
+DERIVED = ("dew_point", "comfort", "pm25_band", "pm10_band", "pressure_slope", "pressure_trend")
+LABELS = {
+    "comfort": app.COMFORT_LABELS,
+    "pm25_band": app.QUALITY_LABELS,
+    "pm10_band": app.QUALITY_LABELS,
+    "pressure_trend": app.PRESSURE_TREND_LABELS,
+}
+TEMP_CHANNELS = ("temp_in", "temp")  # main store / additional BME280 stores
+
+DEFAULT_CHUNK = 65536
+# same gates as pressure_trend_text()
+TREND_MIN_SAMPLES = 6
+TREND_MIN_SPAN = 60
+
+
+def store_channels(directory: str):
+    """Channel layout of a store directory (the main one, or devices/<kind>.<name>)."""
+    kind = os.path.basename(os.path.normpath(directory)).split(".", 1)[0]
+    return DEVICE_CHANNELS.get(kind, CHANNELS)
+
+
+def _window_start(t, seconds):
+    """Index of the first sample in each trailing window [t - seconds, t]."""
+    return np.searchsorted(t, t - seconds, side="left")
+
+
+def rolling_mean(t, v, seconds):
+    """Time-windowed trailing mean over the non-NaN samples; NaN where v is."""
+    out = np.full(len(v), np.nan)
+    ok = ~np.isnan(v)
+    tv, vv = t[ok], v[ok]
+    if not len(vv):
+        return out
+    j = _window_start(tv, seconds)
+    i = np.arange(1, len(vv) + 1)
+    c = np.concatenate(([0.0], np.cumsum(vv)))
+    out[ok] = (c[i] - c[j]) / (i - j)
+    return out
+
+
+def rolling_slope(t, p, seconds):
+    """
+    Least-squares slope (units per hour) over each trailing window, from
+    prefix sums of n, t, p, t², tp; NaN where the window is too thin.
+    """
+    out = np.full(len(p), np.nan)
+    ok = ~np.isnan(p)
+    tv, pv = t[ok], p[ok]
+    if len(pv) < TREND_MIN_SAMPLES:
+        return out
+    tv = tv - tv[0]  # keep the squares small
+    j = _window_start(tv, seconds)
+    i = np.arange(1, len(pv) + 1)
+
+    def win(x):
+        c = np.concatenate(([0.0], np.cumsum(x)))
+        return c[i] - c[j]
+
+    n = (i - j).astype(np.float64)
+    st, sp, stt, stp = win(tv), win(pv), win(tv * tv), win(tv * pv)
+    den = n * stt - st * st
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (n * stp - st * sp) / den * 3600.0
+    thin = (n < TREND_MIN_SAMPLES) | (tv - tv[j] < TREND_MIN_SPAN) | (den <= 0)
+    out[ok] = np.where(thin, np.nan, slope)
+    return out
+
+
+def _codes(values, bands, side):
+    codes = np.searchsorted(np.asarray(bands, dtype=np.float64), values, side=side).astype(np.float64)
+    codes[np.isnan(values)] = np.nan
+    return codes
+
+
+def derive(t, temp, humidity, pm25, pm10, pressure):
+    """Vectorised versions of the display's derived values; float64 columns in DERIVED order."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a, b = 17.62, 243.12  # as dew_point_c()
+        gamma = (a * temp) / (b + temp) + np.log(humidity / 100.0)
+        dew = (b * gamma) / (a - gamma)
+    dew[~np.isfinite(dew)] = np.nan
+
+    if app.AQ_BAND_WINDOW is not None:
+        band_seconds = PM_WINDOWS[app.AQ_BAND_WINDOW][0]
+        pm25 = rolling_mean(t, pm25, band_seconds)
+        pm10 = rolling_mean(t, pm10, band_seconds)
+
+    slope = rolling_slope(t, pressure, PRESSURE_HISTORY_SECONDS)
+    trend = np.full(len(slope), np.nan)
+    mag = np.abs(slope)
+    falling = (slope <= 0).astype(np.float64)
+    trend[mag < app.PRESSURE_TREND_STEADY] = 0
+    mid = (mag >= app.PRESSURE_TREND_STEADY) & (mag < app.PRESSURE_TREND_FAST)
+    trend[mid] = 1 + falling[mid]
+    fast = mag >= app.PRESSURE_TREND_FAST
+    trend[fast] = 3 + falling[fast]
+
+    return (
+        dew,
+        _codes(dew, app.DEW_POINT_BANDS, "right"),   # dp < bound, like comfort_text()
+        _codes(pm25, app.PM_BANDS["pm25"], "left"),  # value <= bound, like quality_label()
+        _codes(pm10, app.PM_BANDS["pm10"], "left"),
+        slope,
+        trend,
+    )
+
+
+class Backfill:
+    """
+    Streams one tier of a TimeSeriesStore through derive() into a RingFile.
+    run() returns (rows, seconds); counts[name][code] tallies the result.
+    """
+
+    def __init__(self, store: TimeSeriesStore, tier: str = "1m", chunk: int = DEFAULT_CHUNK):
+        self.store = store
+        self.tier = tier
+        self.chunk = chunk
+        self.ring = store.tiers[tier]
+        self.bucket_seconds = store.bucket_seconds[tier]
+        self.counts = {name: np.zeros(len(labels), dtype=np.int64) for name, labels in LABELS.items()}
+
+        # word offset of each channel's value (the mean, for rollup tiers)
+        rollup = self.bucket_seconds != 1
+        self._words = {c: (2 + 3 * k + STATS.index("mean") if rollup else 1 + k)
+                       for k, c in enumerate(store.channels)}
+
+        # enough history to fill every rolling window at the start of a chunk
+        band = PM_WINDOWS[app.AQ_BAND_WINDOW][0] if app.AQ_BAND_WINDOW is not None else 0
+        self.carry_seconds = max(band, PRESSURE_HISTORY_SECONDS)
+
+    def _column(self, rows, names):
+        for name in names:
+            if name in self._words:
+                return rows[:, self._words[name]].astype(np.float64)
+        return np.full(len(rows), np.nan)
+
+    def chunks(self):
+        """(timestamps int64, float32 records) per chunk, oldest first, timestamps strictly increasing."""
+        ring = self.ring
+        last = -1
+        i = 0
+        # a live ring can wrap under us; re-bisect after the last timestamp rather than trust indices
+        while i < len(ring):
+            rows = np.frombuffer(ring.records(i, min(len(ring), i + self.chunk)), dtype=np.float32)
+            rows = rows.reshape(-1, ring.width)
+            if not len(rows):
+                break
+            ts = rows.view(np.uint32)[:, 0].astype(np.int64)
+            keep = ts > last
+            if keep.any():
+                yield ts[keep], rows[keep]
+                last = int(ts[keep][-1])
+            i = ring.bisect(last + 1)
+
+    def run(self, out: RingFile) -> tuple:
+        t_start = time.perf_counter()
+        total = 0
+        carry_t = np.empty(0, dtype=np.int64)
+        carry = np.empty((0, self.ring.width), dtype=np.float32)
+
+        for ts, rows in self.chunks():
+            # windows reach back into the previous chunk
+            t_all = np.concatenate((carry_t, ts))
+            rows_all = np.concatenate((carry, rows))
+            cols = derive(
+                t_all.astype(np.float64),
+                self._column(rows_all, TEMP_CHANNELS),
+                self._column(rows_all, ("humidity",)),
+                self._column(rows_all, ("pm25",)),
+                self._column(rows_all, ("pm10",)),
+                self._column(rows_all, ("pressure",)),
+            )
+
+            n = len(ts)
+            rec = np.empty((n, 1 + len(DERIVED)), dtype=np.float32)
+            rec.view(np.uint32)[:, 0] = ts
+            for k, col in enumerate(cols):
+                rec[:, 1 + k] = col[-n:]
+            out.extend(rec)
+
+            for k, name in enumerate(DERIVED):
+                if name in self.counts:
+                    codes = rec[:, 1 + k]
+                    codes = codes[~np.isnan(codes)].astype(np.int64)
+                    self.counts[name] += np.bincount(codes, minlength=len(self.counts[name]))
+
+            keep = t_all > t_all[-1] - self.carry_seconds
+            carry_t, carry = t_all[keep], rows_all[keep]
+            total += n
+
+        return total, time.perf_counter() - t_start
+
+
+def derived_path(store_dir: str, tier: str) -> str:
+    return os.path.join(store_dir, "derived", f"{tier}.ring")
+
+
+def open_derived(store_dir: str, tier: str, store: TimeSeriesStore) -> RingFile:
+    """The derived ring for a tier (same capacity and bucket as the source)."""
+    src = store.tiers[tier]
+    return RingFile(derived_path(store_dir, tier), 1 + len(DERIVED), src.capacity,
+                    store.bucket_seconds[tier], len(DERIVED))
+
+
+def backfill(store_dir: str, tier: str = "1m", chunk: int = DEFAULT_CHUNK, verbose: bool = True):
+    """Rebuild <store_dir>/derived/<tier>.ring. Returns the Backfill (counts) and (rows, seconds)."""
+    store = TimeSeriesStore(store_dir, store_channels(store_dir))
+    path = derived_path(store_dir, tier)
+    tmp = path + ".tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    job = Backfill(store, tier, chunk)
+    out = RingFile(tmp, 1 + len(DERIVED), job.ring.capacity, job.bucket_seconds, len(DERIVED))
+    try:
+        rows, secs = job.run(out)
+        out.flush()
+    finally:
+        out.close()
+        store.close()
+    os.replace(tmp, path)
+
+    if verbose:
+        rate = rows / secs if secs > 0 else math.inf
+        print(f"{rows} rows from {tier} in {secs:.2f}s ({rate:,.0f} rows/s) -> {path}")
+        for name, labels in LABELS.items():
+            counts = job.counts[name]
+            if not counts.sum():
+                continue
+            print(f"  {name}:")
+            for label, c in zip(labels, counts):
+                if c:
+                    print(f"    {label:<30} {c * job.bucket_seconds / 3600:9.1f} h")
+    return job, (rows, secs)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Recompute derived values over stored history")
+    ap.add_argument("--store", default=app.STORE_DIR, help="store directory (default: %(default)s)")
+    ap.add_argument("--tier", default="1m", help="source tier: raw, 1m, 15m, 1h (default: %(default)s)")
+    ap.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="records per chunk (default: %(default)s)")
+    args = ap.parse_args()
+    backfill(os.path.expanduser(args.store), args.tier, args.chunk)
+
+
+if __name__ == "__main__":
+    main()
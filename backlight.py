@@ -0,0 +1,84 @@
+"""
+Backlight sysfs access shared by brightnessd (writes) and the dashboard
+(watches bl_power so it can stop drawing while the panel is off).
+"""
+import os
+
+# Pi official 7" display
+BRIGHTNESS_PATH = "/sys/class/backlight/10-0045/brightness"
+BL_POWER_PATH   = "/sys/class/backlight/10-0045/bl_power"
+
+
+class Backlight:
+    """Keeps the sysfs attributes open and only writes values that differ from the last write."""
+
+    def __init__(self, brightness_path=BRIGHTNESS_PATH, power_path=BL_POWER_PATH):
+        self.paths = {"brightness": brightness_path, "power": power_path}
+        self._fds = {}
+        self._last = {}
+        self.writes = 0
+
+    def _write(self, name, value: int) -> None:
+        if self._last.get(name) == value:
+            return
+        try:
+            fd = self._fds.get(name)
+            if fd is None:
+                fd = self._fds[name] = os.open(self.paths[name], os.O_WRONLY)
+            os.pwrite(fd, str(int(value)).encode(), 0)
+            self._last[name] = value
+            self.writes += 1
+        except OSError:
+            # driver reloaded / permissions: reopen and rewrite next time
+            self._close(name)
+
+    def _close(self, name) -> None:
+        fd = self._fds.pop(name, None)
+        self._last.pop(name, None)
+        if fd is not None:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def apply(self, on: bool, level) -> None:
+        if on:
+            # level first, so the panel never flashes the old brightness
+            self._write("brightness", level)
+        # 0 = on, 1 = off (Pi backlight driver convention)
+        self._write("power", 0 if on else 1)
+
+    def close(self) -> None:
+        for name in list(self._fds):
+            self._close(name)
+
+
+class BacklightWatch:
+    """
+    is_on() re-reads bl_power through a persistent fd (a pread, a few µs),
+    so the display loop can check it every wake. No backlight device (dev
+    machine, HDMI panel) means always on.
+    """
+
+    def __init__(self, power_path=BL_POWER_PATH):
+        self.path = power_path
+        try:
+            self._fd = os.open(power_path, os.O_RDONLY)
+        except OSError:
+            self._fd = None
+
+    def is_on(self) -> bool:
+        if self._fd is None:
+            return True
+        try:
+            return os.pread(self._fd, 8, 0).strip() in (b"0", b"")
+        except OSError:
+            return True
+
+    def close(self) -> None:
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
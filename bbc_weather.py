@@ -1,20 +1,65 @@
+import random
+import threading
 import time
 import re
 import requests
-import feedparser
+
+from metrics import REGISTRY
+
+FETCH_SECONDS = REGISTRY.histogram("aq_weather_fetch_seconds", "BBC feed request latency")
+FETCH_OK = REGISTRY.counter("aq_weather_fetch_total", "BBC feed fetches", labels={"result": "ok"})
+FETCH_NOT_MODIFIED = REGISTRY.counter("aq_weather_fetch_total", labels={"result": "not_modified"})
+FETCH_ERROR = REGISTRY.counter("aq_weather_fetch_total", labels={"result": "error"})
 
 class BBCOutsideTemp:
     """
     Fetches BBC Weather observation RSS and extracts temperature (°C).
     Uses the modern broker endpoint and caches results.
+
+    One pooled requests.Session is reused for every fetch and requests are
+    conditional (If-None-Match / If-Modified-Since), so an unchanged feed
+    comes back as a cheap 304 with no parsing. Failures back off exponentially.
+
+    Call start() to refresh on a background thread: get_temp_c() then never
+    touches the network and just serves the last known value
+    (stale-while-revalidate).
+
+    use_feedparser=False skips feedparser (never imported) and runs the
+    temperature regex over the raw XML; the headless logger uses that.
+
+    Check the 200 / 304 / error-backoff paths against a local stand-in:
+        python3 bbc_weather.py --self-test
     """
-    def __init__(self, location_id: str, refresh_seconds: int = 600):
+    def __init__(self, location_id: str, refresh_seconds: int = 600,
+                 retry_seconds: int = 30, max_backoff_seconds: int = 1800,
+                 timeout: float = 8.0, on_update=None, use_feedparser: bool = True, url: str = None):
         self.location_id = str(location_id)
+        self.url = url  # overrides the BBC endpoint (the stand-in server below)
         self.refresh_seconds = refresh_seconds
+        self.retry_seconds = retry_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.timeout = timeout
+        self.on_update = on_update  # called with the new temp after a change
+        self.use_feedparser = use_feedparser
+
         self._last_fetch = 0.0
+        self._next_fetch = 0.0
         self._last_temp_c = None
+        self.last_success = None  # time.time() of last 200/304
+        self.failures = 0         # consecutive failures, drives the backoff
+
+        self._etag = None
+        self._last_modified = None
+
+        self._session = requests.Session()
+        self._session.headers["User-Agent"] = "Mozilla/5.0"  # helps avoid odd CDN behaviour
+
+        self._thread = None
+        self._stop = threading.Event()
 
     def _feed_url(self) -> str:
+        if self.url:
+            return self.url
         # Modern BBC endpoint (works with your example)
         return f"https://weather-broker-cdn.api.bbci.co.uk/en/observation/rss/{self.location_id}"
 
@@ -39,43 +84,245 @@ class BBCOutsideTemp:
 
         return None
 
-    def get_temp_c(self):
-        now = time.time()
-        if now - self._last_fetch < self.refresh_seconds:
-            return self._last_temp_c
+    def _parse_temp_c(self, content: bytes):
+        if not self.use_feedparser:
+            # first "Temperature: X°C" in the document is the latest observation
+            return self._extract_temp_c(content.decode("utf-8", "replace"))
 
-        headers = {"User-Agent": "Mozilla/5.0"}  # helps avoid odd CDN behaviour
+        import feedparser  # heavy; only the display path pays for it
+        feed = feedparser.parse(content)  # bytes -> avoids encoding weirdness
 
-        try:
-            r = requests.get(self._feed_url(), timeout=8, headers=headers)
-            r.raise_for_status()
-
-            feed = feedparser.parse(r.content)  # bytes -> avoids encoding weirdness
-
-            candidates = []
-            if feed.entries:
-                e0 = feed.entries[0]
-                candidates += [
-                    getattr(e0, "summary", ""),
-                    getattr(e0, "description", ""),
-                    getattr(e0, "title", "")
-                ]
+        candidates = []
+        if feed.entries:
+            e0 = feed.entries[0]
             candidates += [
-                getattr(feed.feed, "description", ""),
-                getattr(feed.feed, "title", "")
+                getattr(e0, "summary", ""),
+                getattr(e0, "description", ""),
+                getattr(e0, "title", "")
             ]
+        candidates += [
+            getattr(feed.feed, "description", ""),
+            getattr(feed.feed, "title", "")
+        ]
 
-            temp = None
-            for c in candidates:
-                temp = self._extract_temp_c(c)
+        for c in candidates:
+            temp = self._extract_temp_c(c)
+            if temp is not None:
+                return temp
+        return None
+
+    def _backoff_seconds(self) -> float:
+        delay = self.retry_seconds * (2 ** (self.failures - 1))
+        delay = min(delay, self.max_backoff_seconds)
+        # a little jitter so several monitors don't retry in lockstep
+        return delay * random.uniform(0.8, 1.2)
+
+    def refresh(self) -> bool:
+        """
+        One blocking, conditional fetch. Returns True if the feed answered
+        (200 or 304), False on any failure. Always reschedules the next fetch.
+        """
+        now = time.time()
+        self._last_fetch = now
+
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+
+        r = None
+        t0 = time.perf_counter()
+        try:
+            r = self._session.get(self._feed_url(), timeout=self.timeout, headers=headers)
+            FETCH_SECONDS.observe(time.perf_counter() - t0)
+            if r.status_code == 304:
+                FETCH_NOT_MODIFIED.inc()
+            else:
+                r.raise_for_status()
+                temp = self._parse_temp_c(r.content)
+
+                # only a feed we could read is worth revalidating; after a partial or
+                # malformed one, ask unconditionally so a 304 can't pin us to it
                 if temp is not None:
-                    break
+                    self._etag = r.headers.get("ETag")
+                    self._last_modified = r.headers.get("Last-Modified")
+                else:
+                    self._etag = self._last_modified = None
 
-            self._last_fetch = now
-            if temp is not None:
-                self._last_temp_c = temp
+                if temp is not None and temp != self._last_temp_c:
+                    self._last_temp_c = temp
+                    if self.on_update is not None:
+                        self.on_update(temp)
+                FETCH_OK.inc()
 
         except Exception:
-            self._last_fetch = now  # keep last known value
+            if r is None:  # timeouts / connection errors count towards latency too
+                FETCH_SECONDS.observe(time.perf_counter() - t0)
+            FETCH_ERROR.inc()
+            self.failures += 1
+            self._next_fetch = now + self._backoff_seconds()
+            return False  # keep last known value
+
+        self.failures = 0
+        self.last_success = now
+        self._next_fetch = now + self.refresh_seconds
+        return True
+
+    def get_temp_c(self):
+        if self._thread is not None:
+            # background mode: never block the caller
+            return self._last_temp_c
 
+        if time.time() >= self._next_fetch:
+            self.refresh()
         return self._last_temp_c
+
+    # --- background refresh ---
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="bbc-weather", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            delay = self._next_fetch - time.time()
+            if delay > 0:
+                self._stop.wait(delay)
+                continue
+            self.refresh()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1.0)
+            self._thread = None
+        self._session.close()
+
+
+# ---------- local stand-in feed, for checking the fetch paths ----------
+
+SAMPLE_FEED = (
+    '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+    "<title>BBC Weather - Observations for Peterborough</title>"
+    "<item><title>Saturday - 10:00 BST: Light Cloud, 14°C (57°F)</title>"
+    "<description>Temperature: 14°C (57°F), Wind Direction: South Westerly, "
+    "Wind Speed: 9mph, Humidity: 72%, Pressure: 1016mb, Steady, Visibility: Good</description>"
+    "</item></channel></rss>"
+).encode("utf-8")
+
+
+def serve(port: int = 0, host: str = "127.0.0.1"):
+    """
+    Stand-in observation feed on a daemon thread. Answers 304 to a matching
+    If-None-Match, and 500 while server.fail is set. Returns the server
+    (server.server_port is the port actually bound).
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            srv = self.server
+            srv.requests += 1
+            if srv.fail:
+                self.send_error(500)
+                return
+            etag = f'"{srv.version}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            body = srv.feed
+            self.send_response(200)
+            self.send_header("Content-Type", "application/rss+xml")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.feed = SAMPLE_FEED
+    server.version = 1
+    server.fail = False
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, name="bbc-standin", daemon=True).start()
+    return server
+
+
+def self_test(use_feedparser: bool = False) -> None:
+    """
+    Drive refresh() through 200, 304, a changed feed, a 500 with backoff and
+    the recovery, then a malformed feed and its repair under the same ETag.
+    """
+    server = serve()
+    url = f"http://127.0.0.1:{server.server_port}/feed"
+    updates = []
+    bbc = BBCOutsideTemp("0", retry_seconds=30, timeout=2.0, on_update=updates.append,
+                         use_feedparser=use_feedparser, url=url)
+    try:
+        assert bbc.refresh() and bbc.get_temp_c() == 14.0 and updates == [14.0], "200 not parsed"
+        assert bbc._etag == '"1"', "ETag not kept"
+
+        before = FETCH_NOT_MODIFIED.value
+        assert bbc.refresh() and FETCH_NOT_MODIFIED.value == before + 1, "no 304 for an unchanged feed"
+        assert updates == [14.0], "304 must not re-notify"
+
+        server.feed = SAMPLE_FEED.replace(b"14\xc2\xb0C", b"9\xc2\xb0C")
+        server.version = 2
+        assert bbc.refresh() and bbc.get_temp_c() == 9.0, "changed feed not picked up"
+
+        server.fail = True
+        now = time.time()
+        assert not bbc.refresh() and bbc.failures == 1, "500 not treated as a failure"
+        assert bbc.get_temp_c() == 9.0, "last known value lost on error"
+        assert bbc._next_fetch >= now + 0.8 * bbc.retry_seconds, "no backoff after a failure"
+        assert not bbc.refresh() and bbc._next_fetch >= now + 1.6 * bbc.retry_seconds, "backoff not growing"
+
+        server.fail = False
+        assert bbc.refresh() and bbc.failures == 0, "no recovery after the server came back"
+        assert bbc._next_fetch >= time.time() + bbc.refresh_seconds - 1, "not back on the normal schedule"
+
+        # a truncated body, then the full one under the same ETag: must not be stuck on 304s
+        good = server.feed
+        server.feed = good[:len(good) // 3]
+        server.version = 3
+        assert bbc.refresh() and bbc.get_temp_c() == 9.0 and bbc._etag is None, "kept validators of a bad feed"
+        server.feed = good.replace(b"9\xc2\xb0C", b"7\xc2\xb0C")
+        before = FETCH_NOT_MODIFIED.value
+        assert bbc.refresh() and bbc.get_temp_c() == 7.0, "no recovery after a malformed feed"
+        assert FETCH_NOT_MODIFIED.value == before, "revalidated a feed that never parsed"
+    finally:
+        bbc.stop()
+        server.shutdown()
+        server.server_close()
+    print(f"ok: {server.requests} requests (200, 304, 200, 500, 500, 304, 200 malformed, 200)")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    ap = argparse.ArgumentParser(description="BBC observation feed client")
+    ap.add_argument("--self-test", action="store_true", help="check 200/304/backoff against a local stand-in")
+    ap.add_argument("--feedparser", action="store_true", help="parse with feedparser in the self-test")
+    ap.add_argument("--serve", type=int, metavar="PORT", help="run the stand-in feed on PORT")
+    ap.add_argument("location", nargs="?", help="fetch once and print the temperature")
+    args = ap.parse_args()
+    if args.self_test:
+        self_test(args.feedparser)
+    elif args.serve is not None:
+        srv = serve(args.serve)
+        print(f"stand-in feed on http://127.0.0.1:{srv.server_port}/")
+        threading.Event().wait()
+    elif args.location:
+        print(BBCOutsideTemp(args.location, use_feedparser=args.feedparser).get_temp_c())
+    else:
+        ap.print_help()
+        sys.exit(2)
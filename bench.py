@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Headless benchmark suite: dashboard widgets, main-loop jitter and the
+driver hot paths, all against simulated hardware (SDL dummy video driver,
+hwsim sensors). Results go to JSON so versions can be compared.
+
+    python3 bench.py                          # writes bench_results.json
+    python3 bench.py --out new.json --compare old.json
+    python3 bench.py --only render,sds011     # subset by group
+
+Timings are in microseconds; throughputs in items per second.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# A tick a millisecond either side of the second boundary isn't visible; loop.tick_lateness
+# sits near zero, so a percentage threshold on it would flag noise
+LATENESS_TOLERANCE_US = 1000.0
+
+# A representative BBC observation feed (what _extract_temp_c usually sees)
+SAMPLE_FEED = (
+    '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+    "<title>BBC Weather - Observations for Peterborough</title>"
+    "<item><title>Saturday - 10:00 BST: Light Cloud, 14°C (57°F)</title>"
+    "<description>Temperature: 14°C (57°F), Wind Direction: South Westerly, "
+    "Wind Speed: 9mph, Humidity: 72%, Pressure: 1016mb, Steady, Visibility: Good</description>"
+    "</item></channel></rss>"
+).encode("utf-8")
+
+
+def _stats(samples_s):
+    us = sorted(x * 1e6 for x in samples_s)
+    if not us:
+        return {"n": 0}
+    return {
+        "n": len(us),
+        "mean_us": statistics.fmean(us),
+        "p50_us": us[len(us) // 2],
+        "p95_us": us[min(len(us) - 1, int(len(us) * 0.95))],
+        "max_us": us[-1],
+    }
+
+
+def _time_calls(fn, n):
+    out = []
+    pc = time.perf_counter
+    for i in range(n):
+        t0 = pc()
+        fn(i)
+        out.append(pc() - t0)
+    return _stats(out)
+
+
+# ---------- groups ----------
+
+def bench_render(n):
+    import pygame
+    import display_app as d
+    from render_cache import Compositor
+    from analytics import RollingRegression
+
+    pygame.init()
+    screen = pygame.display.set_mode((d.WIDTH, d.HEIGHT))
+    t0 = time.perf_counter()
+    page = d.load_pages(screen.get_size())["live"]
+    compile_s = time.perf_counter() - t0
+    comp = Compositor(screen, background=page.background)
+    trend = RollingRegression(1800, min_gap=20)
+
+    # the live page's bound values, as live_values() would hand them over; each group varies its own
+    base = {
+        "pm25": ("pm25", 12.3, 14.0), "pm10": ("pm10", 20.1, 22.0),
+        "outside_temp": 14.0, "inside_temp": 21.5,
+        "pressure": 1012.0, "pressure_trend": d.pressure_trend_text(trend)[0], "pressure_tendency": "3h: --",
+        "humidity": 45.0, "comfort": d.comfort_text(21.5, 45.0),
+        "clock": "01/01/2030 - 12:00:00",
+    }
+    groups = {
+        "aq_block": lambda i: {"pm25": ("pm25", (i % 400) / 3.0, None)},
+        "temperature_block": lambda i: {"outside_temp": 10 + (i % 200) / 10.0, "inside_temp": 20 + (i % 150) / 10.0},
+        "pressure_block": lambda i: {"pressure": 980 + i % 60},
+        "humidity_block": lambda i: {"humidity": 30 + i % 60, "comfort": d.comfort_text(21.0, 30 + i % 60)},
+        "clock": lambda i: {"clock": f"01/01/2030 - 12:{i // 60 % 60:02d}:{i % 60:02d}"},
+    }
+
+    results = {"render.layout.compile": {"n": 1, "p50_us": compile_s * 1e6}}
+    for name, vary in groups.items():
+        page.draw(comp, base)
+        comp.invalidate()
+        comp.flush()
+        # changing: new values every call (formatting, text cache misses, dirty rects)
+        results[f"render.{name}.changing"] = _time_calls(lambda i: (page.draw(comp, {**base, **vary(i)}),
+                                                                    comp.flush()), n)
+        # steady: same values every call (the common case at 1 Hz data): one comparison per widget
+        results[f"render.{name}.steady"] = _time_calls(lambda i: (page.draw(comp, base), comp.flush()), n)
+
+    def full_frame(i):
+        values = dict(base)
+        for vary in groups.values():
+            values.update(vary(i))
+        page.draw(comp, values)
+        comp.flush()
+
+    results["render.full_frame.changing"] = _time_calls(full_frame, n)
+    results["render.full_frame.steady"] = _time_calls(lambda i: (page.draw(comp, base), comp.flush()), n)
+    pygame.quit()
+    return results
+
+
+def bench_loop(seconds):
+    """Wake-up jitter of the redraw scheduler against the 1 Hz clock boundary and worker notifies."""
+    import pygame
+    from scheduler import RedrawScheduler
+    from acquisition import SourceWorker
+
+    pygame.init()
+    pygame.display.set_mode((320, 240))
+    sched = RedrawScheduler(coalesce_ms=50)
+    counter = iter(range(10 ** 9))
+    worker = SourceWorker("bench", lambda: next(counter), interval=0.25, on_update=sched.notify)
+    worker.start()
+
+    lateness = []
+    wakes = 0
+    end = time.time() + seconds
+    while time.time() < end:
+        sched.wait()
+        wakes += 1
+        if sched.timer_wake:
+            frac = time.time() % 1.0
+            lateness.append(frac if frac < 0.5 else frac - 1.0)  # early wakes count as negative
+
+    worker.stop(timeout=1.0)
+    pygame.quit()
+    # fewer wake-ups is better; lateness sits near zero, so compare it with an absolute slack
+    out = {"loop.wakeups_per_s": {"value": wakes / seconds, "better": "lower"}}
+    if lateness:
+        out["loop.tick_lateness"] = dict(_stats(lateness), tolerance=LATENESS_TOLERANCE_US)
+    return out
+
+
+FIRST_FRAME = """
+import time, pygame
+t0 = time.perf_counter()
+import display_app as d
+from render_cache import Compositor
+pygame.init()
+screen = pygame.display.set_mode((d.WIDTH, d.HEIGHT))
+page = d.load_pages(screen.get_size())["live"]
+comp = Compositor(screen, background=page.background)
+page.draw(comp, {"clock": "01/01/2030 - 12:00:00"})
+comp.flush()
+print(time.perf_counter() - t0)
+"""
+
+
+def bench_startup(runs):
+    """Time to first frame in a fresh interpreter, with an empty and then a warm font cache."""
+    import tempfile
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, PYTHONPATH=here)
+
+        def once():
+            out = subprocess.run([sys.executable, "-c", FIRST_FRAME], capture_output=True, text=True,
+                                 env=env, cwd=here).stdout.split()
+            return float(out[-1])
+
+        cold = []
+        for _ in range(runs):
+            font_cache = os.path.join(home, ".cache", "airquality", "fonts.json")
+            if os.path.exists(font_cache):
+                os.remove(font_cache)
+            cold.append(once())
+        warm = [once() for _ in range(runs)]
+    results["startup.first_frame.cold_font_cache"] = _stats(cold)
+    results["startup.first_frame.warm_font_cache"] = _stats(warm)
+    return results
+
+
+def bench_sds011(n):
+    import hwsim
+    from sds011 import SDS011, SDS011FrameParser
+
+    frames = b"".join(hwsim.sds011_frame(i % 500 / 3.0, i % 700 / 3.0) for i in range(n))
+    results = {}
+
+    p = SDS011FrameParser()
+    t0 = time.perf_counter()
+    for off in range(0, len(frames), 4096):
+        p.feed(frames[off:off + 4096])
+    results["sds011.parser.clean"] = {"frames_per_s": n / (time.perf_counter() - t0)}
+
+    noisy = bytearray()
+    for i in range(0, len(frames), 10):
+        f = bytearray(frames[i:i + 10])
+        if i % 70 == 0:
+            f[8] ^= 0xFF          # bad checksum
+        if i % 110 == 0:
+            del f[3]              # dropped byte
+        noisy += f
+    p = SDS011FrameParser()
+    t0 = time.perf_counter()
+    for off in range(0, len(noisy), 4096):
+        p.feed(bytes(noisy[off:off + 4096]))
+    results["sds011.parser.noisy"] = {"frames_per_s": n / (time.perf_counter() - t0), **p.stats()}
+
+    # SDS011.read() through pyserial's in-memory loop:// port, one frame queued per call
+    sds = SDS011("loop://", timeout=0)
+    one = hwsim.sds011_frame(12.3, 45.6)
+    m = min(n, 20000)
+
+    def read(i):
+        sds.ser.write(one)
+        sds.read()
+
+    results["sds011.read"] = _time_calls(read, m)
+    sds.close()
+    return results
+
+
+def bench_filter(n):
+    """Per-sample cost of the SDS011 spike filter; the window sizes show it's O(log n), not O(n)."""
+    import random
+    from analytics import SpikeFilter
+
+    rnd = random.Random(1)
+    clean = [round(max(0.0, 12 + rnd.gauss(0, 1.5)), 1) for _ in range(n)]
+    spiky = [v if i % 50 else 600.0 for i, v in enumerate(clean)]  # 2% single-frame spikes
+    results = {}
+    for window in (15, 101, 1001):
+        f = SpikeFilter(window=window)
+        results[f"filter.spike.w{window}.clean"] = _time_calls(lambda i: f.filter(clean[i]), n)
+        f = SpikeFilter(window=window)
+        results[f"filter.spike.w{window}.spiky"] = _time_calls(lambda i: f.filter(spiky[i]), n)
+        results[f"filter.spike.w{window}.spiky"]["spikes"] = f.spikes
+    return results
+
+
+def bench_bme280(n):
+    from bme280_compensation import SAMPLE_CALIBRATION, compensate, compensate_batch
+    from bme280_spi import BME280SPI
+    import hwsim
+
+    c = SAMPLE_CALIBRATION
+    results = {}
+    t0 = time.perf_counter()
+    for i in range(n):
+        compensate(c, 500_000 + i % 50_000, 330_000 + i % 30_000, 28_000 + i % 10_000)
+    results["bme280.compensate.scalar"] = {"samples_per_s": n / (time.perf_counter() - t0)}
+
+    try:
+        import numpy as np
+        adc_T = 500_000 + np.arange(n * 10) % 50_000
+        adc_P = 330_000 + np.arange(n * 10) % 30_000
+        adc_H = 28_000 + np.arange(n * 10) % 10_000
+        t0 = time.perf_counter()
+        compensate_batch(c, adc_T, adc_P, adc_H)
+        results["bme280.compensate.batch"] = {"samples_per_s": n * 10 / (time.perf_counter() - t0)}
+    except ImportError:
+        pass
+
+    init = []
+    for _ in range(50):
+        t0 = time.perf_counter()
+        BME280SPI(spi_factory=hwsim.FakeSpiDev, calib_cache=None, mode="forced")
+        init.append(time.perf_counter() - t0)
+    results["bme280.init.fake_spi"] = _stats(init)
+    return results
+
+
+def bench_bbc(n):
+    from bbc_weather import BBCOutsideTemp
+
+    text = ("Temperature: 14Â°C (57Â°F), Wind Direction: South Westerly, "
+            "Wind Speed: 9mph, Humidity: 72%, Pressure: 1016mb")
+    bbc = BBCOutsideTemp("0")
+    return {
+        "bbc.extract_temp_c": _time_calls(lambda i: BBCOutsideTemp._extract_temp_c(text), n),
+        "bbc.parse_feed": _time_calls(lambda i: bbc._parse_temp_c(SAMPLE_FEED), max(1, n // 20)),
+    }
+
+
+GROUPS = {
+    "render": lambda a: bench_render(a.frames),
+    "loop": lambda a: bench_loop(a.loop_seconds),
+    "startup": lambda a: bench_startup(a.startup_runs),
+    "sds011": lambda a: bench_sds011(a.iterations),
+    "filter": lambda a: bench_filter(a.iterations),
+    "bme280": lambda a: bench_bme280(a.iterations),
+    "bbc": lambda a: bench_bbc(a.iterations),
+}
+
+
+# ---------- output ----------
+
+def _meta():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        rev = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_rev": rev,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+    }
+
+
+def _headline(entry):
+    """
+    The single number used for comparisons, whether bigger is better, and an
+    absolute tolerance in the same units. Rates default to higher-is-better and
+    timings to lower; an entry's "better" ("higher"/"lower") and "tolerance"
+    override that.
+    """
+    for k in ("frames_per_s", "samples_per_s", "value"):
+        if k in entry:
+            value, better = entry[k], "higher"
+            break
+    else:
+        value, better = entry.get("p50_us"), "lower"
+    return value, entry.get("better", better) == "higher", entry.get("tolerance", 0.0)
+
+
+def compare(old, new, threshold):
+    """A regression is a change for the worse beyond threshold (fraction) and the entry's tolerance."""
+    regressions = []
+    for name, entry in new["results"].items():
+        if name not in old.get("results", {}):
+            continue
+        a, _, _ = _headline(old["results"][name])
+        b, higher_better, tolerance = _headline(entry)  # older files may lack "better"/"tolerance"
+        if a is None or b is None:
+            continue
+        diff = b - a
+        worse = -diff if higher_better else diff
+        flag = "REGRESSION" if worse > max(threshold * abs(a), tolerance) else ""
+        if flag:
+            regressions.append(name)
+        change = f"{diff / abs(a):+.1%}" if a else "n/a"
+        print(f"{name:40s} {a:14.2f} -> {b:14.2f} ({change}) {flag}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--compare", help="previous results JSON to diff against")
+    ap.add_argument("--threshold", type=float, default=0.10, help="regression threshold (fraction)")
+    ap.add_argument("--only", help="comma separated groups: " + ",".join(GROUPS))
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--iterations", type=int, default=20000)
+    ap.add_argument("--loop-seconds", type=float, default=5.0)
+    ap.add_argument("--startup-runs", type=int, default=5)
+    args = ap.parse_args()
+
+    names = args.only.split(",") if args.only else list(GROUPS)
+    results = {}
+    for name in names:
+        print(f"running {name}...", file=sys.stderr)
+        results.update(GROUPS[name](args))
+
+    doc = {"meta": _meta(), "results": results}
+    with open(args.out, "w") as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+    print(f"wrote {args.out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if compare(old, doc, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
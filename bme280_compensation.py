@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+BME280 calibration + compensation, without any SPI dependency.
+
+The scalar functions are the Bosch datasheet floating point formulas used
+by BME280SPI for live reads. compensate_batch() is the same maths over
+NumPy arrays, for recomputing months of logged raw ADC data in one call.
+
+Run directly for a parity check (exits 1 on a mismatch) and a throughput benchmark:
+    python3 bme280_compensation.py
+"""
+import json
+import os
+import struct
+import time
+from array import array
+from dataclasses import asdict, dataclass, replace
+
+
+# Calibration register blocks (little-endian)
+CALIB_TP_REG = 0x88
+CALIB_TP_STRUCT = struct.Struct("<HhhHhhhhhhhhxB")  # 0x88..0xA1, 0xA0 unused
+CALIB_H_REG = 0xE1
+CALIB_H_STRUCT = struct.Struct("<hBBBBb")          # 0xE1..0xE7
+
+
+@dataclass(frozen=True)
+class BME280Calibration:
+    dig_T1: int
+    dig_T2: int
+    dig_T3: int
+    dig_P1: int
+    dig_P2: int
+    dig_P3: int
+    dig_P4: int
+    dig_P5: int
+    dig_P6: int
+    dig_P7: int
+    dig_P8: int
+    dig_P9: int
+    dig_H1: int
+    dig_H2: int
+    dig_H3: int
+    dig_H4: int
+    dig_H5: int
+    dig_H6: int
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_registers(cls, tp: bytes, h: bytes) -> "BME280Calibration":
+        """
+        Parse the two calibration blocks: tp = 26 bytes from 0x88..0xA1,
+        h = 7 bytes from 0xE1..0xE7.
+        """
+        (t1, t2, t3, p1, p2, p3, p4, p5, p6, p7, p8, p9, h1) = CALIB_TP_STRUCT.unpack(bytes(tp))
+        h2, h3, e4, e5, e6, h6 = CALIB_H_STRUCT.unpack(bytes(h))
+        h4 = (e4 << 4) | (e5 & 0x0F)
+        h5 = (e6 << 4) | (e5 >> 4)
+        return cls(t1, t2, t3, p1, p2, p3, p4, p5, p6, p7, p8, p9, h1, h2, h3, h4, h5, h6)
+
+    def to_registers(self):
+        """Inverse of from_registers(): (tp, h) register bytes."""
+        tp = CALIB_TP_STRUCT.pack(
+            self.dig_T1, self.dig_T2, self.dig_T3,
+            self.dig_P1, self.dig_P2, self.dig_P3, self.dig_P4, self.dig_P5,
+            self.dig_P6, self.dig_P7, self.dig_P8, self.dig_P9, self.dig_H1,
+        )
+        e4 = (self.dig_H4 >> 4) & 0xFF
+        e5 = ((self.dig_H5 & 0x0F) << 4) | (self.dig_H4 & 0x0F)
+        e6 = (self.dig_H5 >> 4) & 0xFF
+        h = CALIB_H_STRUCT.pack(self.dig_H2, self.dig_H3, e4, e5, e6, self.dig_H6)
+        return tp, h
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "BME280Calibration":
+        return cls(**{k: int(d[k]) for k in cls.__dataclass_fields__})
+
+
+# --- Compensation formulas (from Bosch datasheet) ---
+def compensate_temperature(c: BME280Calibration, adc_T):
+    """Returns (temp_c, t_fine)."""
+    var1 = (adc_T / 16384.0 - c.dig_T1 / 1024.0) * c.dig_T2
+    var2 = ((adc_T / 131072.0 - c.dig_T1 / 8192.0) ** 2) * c.dig_T3
+    return (var1 + var2) / 5120.0, int(var1 + var2)
+
+
+def compensate_pressure(c: BME280Calibration, adc_P, t_fine):
+    var1 = t_fine / 2.0 - 64000.0
+    var2 = var1 * var1 * c.dig_P6 / 32768.0
+    var2 = var2 + var1 * c.dig_P5 * 2.0
+    var2 = var2 / 4.0 + c.dig_P4 * 65536.0
+    var1 = (c.dig_P3 * var1 * var1 / 524288.0 + c.dig_P2 * var1) / 524288.0
+    var1 = (1.0 + var1 / 32768.0) * c.dig_P1
+    if var1 == 0:
+        return 0.0
+    p = 1048576.0 - adc_P
+    p = (p - var2 / 4096.0) * 6250.0 / var1
+    var1 = c.dig_P9 * p * p / 2147483648.0
+    var2 = p * c.dig_P8 / 32768.0
+    p = p + (var1 + var2 + c.dig_P7) / 16.0
+    # p is Pa; convert to hPa/mb
+    return p / 100.0
+
+
+def compensate_humidity(c: BME280Calibration, adc_H, t_fine):
+    h = t_fine - 76800.0
+    if h == 0:
+        return 0.0
+    h = (adc_H - (c.dig_H4 * 64.0 + c.dig_H5 / 16384.0 * h)) * (
+        c.dig_H2 / 65536.0 * (1.0 + c.dig_H6 / 67108864.0 * h * (1.0 + c.dig_H3 / 67108864.0 * h))
+    )
+    h = h * (1.0 - c.dig_H1 * h / 524288.0)
+    return max(0.0, min(100.0, h))
+
+
+def compensate(c: BME280Calibration, adc_T, adc_P, adc_H):
+    """Scalar path: returns (temp_c, humidity_pct, pressure_mb)."""
+    temp_c, t_fine = compensate_temperature(c, adc_T)
+    return temp_c, compensate_humidity(c, adc_H, t_fine), compensate_pressure(c, adc_P, t_fine)
+
+
+def compensate_batch(c: BME280Calibration, adc_T, adc_P, adc_H):
+    """
+    Vectorised compensate(): array-likes of raw ADC values in, float64
+    arrays (temp_c, humidity_pct, pressure_mb) out. Same formulas and the
+    same edge cases (int truncation of t_fine, var1 == 0, h == 0).
+    """
+    import numpy as np  # optional: only needed for batch work
+
+    adc_T = np.asarray(adc_T, dtype=np.float64)
+    adc_P = np.asarray(adc_P, dtype=np.float64)
+    adc_H = np.asarray(adc_H, dtype=np.float64)
+
+    # temperature
+    var1 = (adc_T / 16384.0 - c.dig_T1 / 1024.0) * c.dig_T2
+    var2 = ((adc_T / 131072.0 - c.dig_T1 / 8192.0) ** 2) * c.dig_T3
+    temp_c = (var1 + var2) / 5120.0
+    t_fine = np.trunc(var1 + var2)
+
+    # pressure
+    var1 = t_fine / 2.0 - 64000.0
+    var2 = var1 * var1 * c.dig_P6 / 32768.0
+    var2 = var2 + var1 * c.dig_P5 * 2.0
+    var2 = var2 / 4.0 + c.dig_P4 * 65536.0
+    var1 = (c.dig_P3 * var1 * var1 / 524288.0 + c.dig_P2 * var1) / 524288.0
+    var1 = (1.0 + var1 / 32768.0) * c.dig_P1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = 1048576.0 - adc_P
+        p = (p - var2 / 4096.0) * 6250.0 / var1
+        v1 = c.dig_P9 * p * p / 2147483648.0  # inf/nan where var1 == 0, masked below
+        v2 = p * c.dig_P8 / 32768.0
+        p = p + (v1 + v2 + c.dig_P7) / 16.0
+    pressure_mb = np.where(var1 == 0, 0.0, p / 100.0)
+
+    # humidity
+    h = t_fine - 76800.0
+    hum = (adc_H - (c.dig_H4 * 64.0 + c.dig_H5 / 16384.0 * h)) * (
+        c.dig_H2 / 65536.0 * (1.0 + c.dig_H6 / 67108864.0 * h * (1.0 + c.dig_H3 / 67108864.0 * h))
+    )
+    hum = hum * (1.0 - c.dig_H1 * hum / 524288.0)
+    humidity_pct = np.where(h == 0, 0.0, np.clip(hum, 0.0, 100.0))
+
+    return temp_c, humidity_pct, pressure_mb
+
+
+class RawAdcLog:
+    """
+    Append-only log of raw BME280 samples: uint32 (timestamp, adc_T, adc_P, adc_H)
+    records. Lets us recompute (or recalibrate) the whole history later with
+    compensate_batch().
+
+    The log is split into segments <path>.<start epoch>, each with its own
+    <segment>.calib.json. A new segment starts whenever the calibration
+    changes (sensor swapped), so every record keeps the calibration of the
+    chip that produced it, and whenever the current one reaches
+    max_segment_bytes. The oldest segments are deleted to keep the whole log
+    under max_bytes (16 B/s is ~500 MB a year; the defaults keep ~3 months).
+    A <path> left by older versions is treated as the first segment.
+    """
+
+    RECORD_WORDS = 4
+
+    def __init__(self, path: str, max_segment_bytes: int = 16 << 20, max_bytes: int = 128 << 20):
+        self.path = path
+        self.max_segment_bytes = max_segment_bytes
+        self.max_bytes = max_bytes
+        self._f = None
+        self._calib = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # carry on with the newest segment; write_calibration() decides whether it still fits
+        segments = self.segments()
+        self._segment = segments[-1] if segments else None
+        self._size = os.path.getsize(self._segment) if self._segment else 0
+        if self._segment:
+            try:
+                self._calib = self.read_calibration(self._segment)
+            except Exception:
+                pass
+
+    def segments(self):
+        """Segment paths, oldest first."""
+        d = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(self.path) + "."
+        names = sorted(n for n in os.listdir(d) if n.startswith(prefix) and n[len(prefix):].isdigit())
+        out = [os.path.join(d, n) for n in names]
+        if os.path.exists(self.path):
+            out.insert(0, self.path)
+        return out
+
+    def _start_segment(self) -> None:
+        self.close()
+        start = int(time.time())
+        if self._segment is not None and self._segment != self.path:
+            start = max(start, int(self._segment.rsplit(".", 1)[1]) + 1)  # names must sort in order
+        self._segment = f"{self.path}.{start:010d}"
+        self._size = 0
+        if self._calib is not None:
+            tmp = self._segment + ".calib.json.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._calib.to_dict(), f)
+            os.replace(tmp, self._segment + ".calib.json")
+        open(self._segment, "ab").close()
+        self._trim()
+
+    def _trim(self) -> None:
+        """Drop the oldest segments (never the current one) while over max_bytes."""
+        segments = self.segments()
+        total = sum(os.path.getsize(s) for s in segments)
+        for s in segments[:-1]:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(s)
+            for p in (s, s + ".calib.json"):
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+
+    def write_calibration(self, calib: BME280Calibration) -> None:
+        """Called on every sensor (re)init; only a different calibration starts a new segment."""
+        if self._segment is not None and calib == self._calib:
+            return
+        self._calib = calib
+        self._start_segment()
+
+    def read_calibration(self, segment: str = None) -> BME280Calibration:
+        """Calibration for one segment (default: the current one)."""
+        with open((segment or self._segment or self.path) + ".calib.json") as f:
+            return BME280Calibration.from_dict(json.load(f))
+
+    def append(self, ts: float, adc_T: int, adc_P: int, adc_H: int) -> None:
+        if self._segment is None or self._size >= self.max_segment_bytes:
+            self._start_segment()
+        if self._f is None:
+            self._f = open(self._segment, "ab")
+        array("I", (int(ts), adc_T, adc_P, adc_H)).tofile(self._f)
+        self._size += 4 * self.RECORD_WORDS
+
+    def flush(self) -> None:
+        if self._f is not None:
+            self._f.flush()
+
+    def load(self, segment: str = None):
+        """(timestamps, adc_T, adc_P, adc_H) of one segment (default: the current one) as NumPy uint32 arrays."""
+        import numpy as np
+
+        self.flush()
+        path = segment or self._segment or self.path
+        n = os.path.getsize(path) // (4 * self.RECORD_WORDS)
+        if not n:
+            data = np.empty((0, self.RECORD_WORDS), dtype="<u4")
+        else:
+            data = np.memmap(path, dtype="<u4", mode="r", shape=(n, self.RECORD_WORDS))
+        return data[:, 0], data[:, 1], data[:, 2], data[:, 3]
+
+    def compensated(self):
+        """
+        Yields (timestamps, temp_c, humidity_pct, pressure_mb) per segment,
+        oldest first, each compensated with its own calibration. Segments
+        without a calibration are skipped.
+        """
+        for segment in self.segments():
+            try:
+                calib = self.read_calibration(segment)
+            except (OSError, ValueError, KeyError):
+                continue
+            ts, adc_T, adc_P, adc_H = self.load(segment)
+            if len(ts):
+                yield (ts,) + compensate_batch(calib, adc_T, adc_P, adc_H)
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+# Typical calibration coefficients, for benchmarks and simulation.
+SAMPLE_CALIBRATION = BME280Calibration(
+    dig_T1=28011, dig_T2=26435, dig_T3=50,
+    dig_P1=37731, dig_P2=-10615, dig_P3=3024, dig_P4=7255, dig_P5=-71,
+    dig_P6=-7, dig_P7=9900, dig_P8=-10230, dig_P9=4285,
+    dig_H1=75, dig_H2=362, dig_H3=0, dig_H4=313, dig_H5=50, dig_H6=30,
+)
+
+
+# Fixed vectors for branches a random ADC sweep rarely reaches:
+# (what, calibration, adc_T, adc_P, adc_H, check on the scalar (temp_c, humidity_pct, pressure_mb))
+EDGE_CASES = (
+    ("sub-zero t_fine truncation", SAMPLE_CALIBRATION, 400_000, 330_000, 30_000, lambda r: r[0] < 0),
+    ("deep frost", SAMPLE_CALIBRATION, 300_000, 330_000, 30_000, lambda r: r[0] < -40),
+    ("pressure var1 == 0", replace(SAMPLE_CALIBRATION, dig_P1=0), 520_000, 330_000, 30_000,
+     lambda r: r[2] == 0.0),
+    ("humidity clamped at 0", SAMPLE_CALIBRATION, 520_000, 330_000, 0, lambda r: r[1] == 0.0),
+    ("humidity clamped at 100", SAMPLE_CALIBRATION, 520_000, 330_000, 0xFFFF, lambda r: r[1] == 100.0),
+)
+PARITY_TOLERANCE = 1e-9
+
+
+def _check_edges() -> float:
+    """Scalar vs batch on EDGE_CASES; asserts each case hits its branch. Returns the worst difference."""
+    worst = 0.0
+    for what, c, adc_T, adc_P, adc_H, check in EDGE_CASES:
+        scalar = compensate(c, adc_T, adc_P, adc_H)
+        batch = [float(col[0]) for col in compensate_batch(c, [adc_T], [adc_P], [adc_H])]
+        assert check(scalar), f"{what}: vector no longer reaches its branch {scalar}"
+        diff = max(abs(a - b) for a, b in zip(scalar, batch))
+        assert diff <= PARITY_TOLERANCE, f"{what}: scalar {scalar} != batch {batch}"
+        worst = max(worst, diff)
+    return worst
+
+
+def _bench(n: int = 200_000) -> None:
+    """Parity check (fails loudly) and throughput of the scalar vs batch paths."""
+    import numpy as np
+
+    edge = _check_edges()
+    print(f"edges:  {len(EDGE_CASES)} cases, max abs diff {edge:.3g}")
+
+    rng = np.random.default_rng(1)
+    c = SAMPLE_CALIBRATION
+    adc_T = rng.integers(480_000, 560_000, n)
+    adc_P = rng.integers(300_000, 360_000, n)
+    adc_H = rng.integers(20_000, 40_000, n)
+
+    t0 = time.perf_counter()
+    bt, bh, bp = compensate_batch(c, adc_T, adc_P, adc_H)
+    batch_s = time.perf_counter() - t0
+
+    m = min(n, 20_000)
+    t0 = time.perf_counter()
+    scalar = [compensate(c, int(adc_T[i]), int(adc_P[i]), int(adc_H[i])) for i in range(m)]
+    scalar_s = (time.perf_counter() - t0) * n / m
+
+    st, sh, sp = (np.array(col) for col in zip(*scalar))
+    worst = max(
+        float(np.max(np.abs(st - bt[:m]))),
+        float(np.max(np.abs(sh - bh[:m]))),
+        float(np.max(np.abs(sp - bp[:m]))),
+    )
+    print(f"parity: max abs diff {worst:.3g} over {m} samples")
+    assert worst <= PARITY_TOLERANCE, f"batch path drifted from the scalar one by {worst:.3g}"
+    print(f"scalar: {n / scalar_s:,.0f} samples/s")
+    print(f"batch:  {n / batch_s:,.0f} samples/s ({scalar_s / batch_s:.0f}x)")
+
+
+if __name__ == "__main__":
+    import sys
+
+    try:
+        _bench()
+    except AssertionError as e:
+        print(f"FAIL: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -11,16 +11,30 @@ class BME280Sensor:
     """
     Robust BME280 reader over SPI (spidev0.0 / CE0 by default).
     Returns (temp_c, humidity_pct, pressure_mb).
+
+    If raw_log (a bme280_compensation.RawAdcLog) is given, every raw ADC
+    triple is appended to it and the calibration is saved on each (re)init
+    (a different one starts a new log segment), so history can be recomputed
+    later in batch.
+
+    Extra keyword arguments (mode, osrs_t/p/h, iir_filter, standby_ms,
+    spi_factory, calib_cache) are passed to BME280SPI. read() returns all None when no new sample is ready.
     """
 
-    def __init__(self, retry_seconds: int = 10, bus: int = 0, device: int = 0):
+    def __init__(self, retry_seconds: int = 10, bus: int = 0, device: int = 0, raw_log=None,
+                 **acquisition):
         self.retry_seconds = retry_seconds
         self.bus = bus
         self.device = device
+        self.raw_log = raw_log
+        self.acquisition = acquisition
 
         self._bme = None
         self._last_init_attempt = 0.0
 
+        self.init_count = 0          # successful inits (first one + reinits)
+        self.last_init_seconds = None
+
     def _try_init(self) -> None:
         now = time.time()
         if self._bme is not None:
@@ -34,9 +48,57 @@ class BME280Sensor:
             return
 
         try:
-            self._bme = BME280SPI(bus=self.bus, device=self.device)
+            self._bme = BME280SPI(bus=self.bus, device=self.device, **self.acquisition)
         except Exception:
             self._bme = None
+            return
+
+        self.init_count += 1
+        self.last_init_seconds = self._bme.init_seconds
+
+        if self.raw_log is not None:
+            try:
+                self.raw_log.write_calibration(self._bme.calib)
+            except Exception:
+                pass
+
+    def next_sample_due(self) -> float:
+        """time.monotonic() when the next read() can produce new data."""
+        if self._bme is None:
+            wait = self._last_init_attempt + self.retry_seconds - time.time()
+            return time.monotonic() + max(0.0, wait)
+        return self._bme.next_sample_due()
+
+    def pending(self) -> Optional[float]:
+        """
+        Forced mode: time.monotonic() to call read() again when a triggered
+        conversion was still running; None otherwise.
+        """
+        if self._bme is None:
+            return None
+        return self._bme.pending()
+
+    def _drop(self) -> None:
+        try:
+            self._bme.close()
+        except Exception:
+            pass
+        self._bme = None
+
+    def trigger(self) -> Optional[float]:
+        """
+        Forced mode: start a conversion without waiting. Returns the
+        time.monotonic() when read() can collect it, or None if there's
+        nothing to trigger (normal mode, sensor not up yet).
+        """
+        self._try_init()
+        if self._bme is None:
+            return None
+        try:
+            return self._bme.trigger()
+        except Exception:
+            self._drop()
+            return None
 
     def read(self) -> Tuple[Optional[float], Optional[float], Optional[float]]:
         self._try_init()
@@ -45,12 +107,18 @@ class BME280Sensor:
 
         try:
             r = self._bme.read()
-            return r.temperature_c, r.humidity_pct, r.pressure_mb
         except Exception:
             # if the bus/sensor hiccups, drop and re-init later
+            self._drop()
+            return None, None, None
+
+        if r is None:
+            return None, None, None  # no new conversion yet
+
+        if self.raw_log is not None and r.adc is not None:
             try:
-                self._bme.close()
+                self.raw_log.append(time.time(), *r.adc)
             except Exception:
                 pass
-            self._bme = None
-            return None, None, None
+
+        return r.temperature_c, r.humidity_pct, r.pressure_mb
@@ -1,6 +1,24 @@
+import json
+import os
 import time
-import spidev
 from dataclasses import dataclass
+from typing import Optional, Tuple
+
+try:
+    import spidev
+except ImportError:
+    spidev = None  # only needed for real hardware; see spi_factory
+
+from bme280_compensation import (
+    BME280Calibration,
+    CALIB_TP_REG,
+    CALIB_TP_STRUCT,
+    CALIB_H_REG,
+    CALIB_H_STRUCT,
+    compensate_temperature,
+    compensate_pressure,
+    compensate_humidity,
+)
 
 # BME280 registers
 REG_ID = 0xD0
@@ -11,15 +29,75 @@ REG_CTRL_MEAS = 0xF4
 REG_CONFIG = 0xF5
 REG_PRESS_MSB = 0xF7  # starts burst: press[3] temp[3] hum[2]
 
+STATUS_MEASURING = 0x08  # conversion running
+STATUS_IM_UPDATE = 0x01  # NVM data being copied
+
+FORCED_RETRY_S = 0.002  # recheck interval for a forced conversion still running at its due time
+
+# Register encodings for the acquisition settings
+MODES = {"sleep": 0b00, "forced": 0b01, "normal": 0b11}
+OVERSAMPLING = {0: 0, 1: 1, 2: 2, 4: 3, 8: 4, 16: 5}  # 0 = skipped
+IIR_FILTER = {0: 0, 2: 1, 4: 2, 8: 3, 16: 4}         # 0 = off
+STANDBY_MS = {0.5: 0, 62.5: 1, 125: 2, 250: 3, 500: 4, 1000: 5, 10: 6, 20: 7}
+
+# Preallocated transmit buffers for the two calibration bursts (read bit set)
+_CALIB_TP_TX = [CALIB_TP_REG | 0x80] + [0x00] * CALIB_TP_STRUCT.size
+_CALIB_H_TX = [CALIB_H_REG | 0x80] + [0x00] * CALIB_H_STRUCT.size
+_CALIB_CHECK_LEN = 4  # dig_T1 + dig_T2, re-read to confirm a cached entry
+
+DEFAULT_CALIB_CACHE = os.path.expanduser("~/.cache/airquality/bme280_calib.json")
+
 @dataclass
 class BME280Reading:
     temperature_c: float
     humidity_pct: float
     pressure_mb: float  # mb == hPa
+    adc: Optional[Tuple[int, int, int]] = None  # raw (adc_T, adc_P, adc_H), for logging/recompute
+
+def measurement_time_ms(osrs_t: int, osrs_p: int, osrs_h: int) -> float:
+    """Maximum conversion time from the datasheet (section 9.1)."""
+    t = 1.25
+    if osrs_t:
+        t += 2.3 * osrs_t
+    if osrs_p:
+        t += 2.3 * osrs_p + 0.575
+    if osrs_h:
+        t += 2.3 * osrs_h + 0.575
+    return t
+
 
 class BME280SPI:
-    def __init__(self, bus=0, device=0, max_hz=500_000):
-        self.spi = spidev.SpiDev()
+    """
+    calib_cache: JSON file of parsed calibration keyed by SPI bus/device and
+    chip id (None disables). On a hit only 4 bytes are re-read to confirm it's
+    the same chip, instead of the two calibration bursts.
+    init_seconds records how long bring-up took.
+
+    Acquisition: mode "normal" (free running, one conversion every
+    measurement time + standby_ms) or "forced" (one conversion per read(),
+    sensor sleeps in between, so less self-heating). osrs_* are the
+    oversampling factors (0 skips a channel), iir_filter the filter coefficient.
+    read() returns None when no conversion has completed since the sample
+    it last returned; in normal mode that is judged from the sensor (status
+    bit, data registers), the clock only stops it polling too early.
+
+    spi_factory: callable returning a spidev.SpiDev-like object (default
+    spidev.SpiDev); hwsim.FakeSpiDev plugs in here for off-Pi runs.
+    """
+    def __init__(self, bus=0, device=0, max_hz=500_000, calib_cache=DEFAULT_CALIB_CACHE,
+                 mode="normal", osrs_t=1, osrs_p=1, osrs_h=1, iir_filter=0, standby_ms=1000,
+                 spi_factory=None):
+        started = time.perf_counter()
+        self.bus = bus
+        self.device = device
+        self.calib_cache = calib_cache
+        self.calib_from_cache = False
+
+        if spi_factory is None:
+            if spidev is None:
+                raise RuntimeError("spidev not installed (sudo apt install -y python3-spidev)")
+            spi_factory = spidev.SpiDev
+        self.spi = spi_factory()
         self.spi.open(bus, device)
         self.spi.max_speed_hz = max_hz
         self.spi.mode = 0b00
@@ -28,18 +106,84 @@ class BME280SPI:
         if chip_id != 0x60:
             raise RuntimeError(f"Not a BME280 (chip id {hex(chip_id)})")
 
-        # Read calibration data
-        self._read_calibration()
+        # Read calibration data (cached across restarts/reinits)
+        self._load_calibration(chip_id)
 
-        # Configure sensor (oversampling + normal mode)
-        # humidity oversampling x1
-        self.write_u8(REG_CTRL_HUM, 0x01)
-        # temp oversampling x1, pressure oversampling x1, normal mode
-        self.write_u8(REG_CTRL_MEAS, 0x27)
-        # standby 1000ms, filter off
-        self.write_u8(REG_CONFIG, 0xA0)
+        self.configure(mode, osrs_t, osrs_p, osrs_h, iir_filter, standby_ms)
 
         self.t_fine = 0
+        self.init_seconds = time.perf_counter() - started
+
+    # --- acquisition settings ---
+    def configure(self, mode="normal", osrs_t=1, osrs_p=1, osrs_h=1, iir_filter=0, standby_ms=1000):
+        if mode not in ("normal", "forced"):
+            raise ValueError(f"mode must be 'normal' or 'forced', not {mode!r}")
+        try:
+            ctrl_hum = OVERSAMPLING[osrs_h]
+            meas = (OVERSAMPLING[osrs_t] << 5) | (OVERSAMPLING[osrs_p] << 2)
+            config = (STANDBY_MS[standby_ms] << 5) | (IIR_FILTER[iir_filter] << 2)
+        except KeyError as e:
+            raise ValueError(f"unsupported BME280 setting: {e}") from None
+
+        self.mode = mode
+        self.osrs = (osrs_t, osrs_p, osrs_h)
+        self.iir_filter = iir_filter
+        self.standby_ms = standby_ms
+        self.measure_s = measurement_time_ms(osrs_t, osrs_p, osrs_h) / 1000.0
+        self._ctrl_meas = meas
+
+        # config is only reliably written in sleep mode; ctrl_hum applies on the ctrl_meas write
+        self.write_u8(REG_CTRL_MEAS, meas | MODES["sleep"])
+        self.write_u8(REG_CONFIG, config)
+        self.write_u8(REG_CTRL_HUM, ctrl_hum)
+        if mode == "normal":
+            self.write_u8(REG_CTRL_MEAS, meas | MODES["normal"])
+            self._period_s = self.measure_s + standby_ms / 1000.0
+        else:
+            self._period_s = 0.0
+
+        # normal mode: newness comes from the sensor (see read()); the clock only
+        # says when polling is pointless. First result is ready one period after starting.
+        now = time.monotonic()
+        self._last_poll = now
+        self._not_before = now + self._period_s
+        self._last_burst = None
+        self._saw_measuring = False
+        self._forced_due = None
+        self._forced_deadline = None
+
+    def next_sample_due(self) -> float:
+        """Earliest time.monotonic() at which read() can return a new sample."""
+        if self.mode == "forced":
+            return time.monotonic()
+        return self._not_before
+
+    def trigger(self) -> Optional[float]:
+        """
+        Forced mode only: start a conversion and return straight away with the
+        time.monotonic() at which read() can collect it without sleeping.
+        Lets one thread service several sensors. None in normal mode.
+        """
+        if self.mode != "forced":
+            return None
+        self.write_u8(REG_CTRL_MEAS, self._ctrl_meas | MODES["forced"])
+        self._forced_due = time.monotonic() + self.measure_s
+        self._forced_deadline = self._forced_due + self.measure_s * 2
+        return self._forced_due
+
+    def pending(self) -> Optional[float]:
+        """
+        Forced mode: time.monotonic() at which to call read() again for a
+        triggered conversion it hasn't collected yet; None if nothing is outstanding.
+        """
+        return self._forced_due if self.mode == "forced" else None
+
+    def _wait_idle(self, timeout_s: float) -> None:
+        deadline = time.monotonic() + timeout_s
+        while self.read_u8(REG_STATUS) & (STATUS_MEASURING | STATUS_IM_UPDATE):
+            if time.monotonic() >= deadline:
+                raise TimeoutError("BME280 conversion did not finish")
+            time.sleep(0.001)
 
     # --- SPI low-level helpers ---
     def read_bytes(self, reg, length):
@@ -64,70 +208,95 @@ class BME280SPI:
         return v - 65536 if v > 32767 else v
 
     def _read_calibration(self):
-        # Temperature and pressure calibration (0x88..0xA1)
-        self.dig_T1 = self.read_u16_le(0x88)
-        self.dig_T2 = self.read_s16_le(0x8A)
-        self.dig_T3 = self.read_s16_le(0x8C)
-
-        self.dig_P1 = self.read_u16_le(0x8E)
-        self.dig_P2 = self.read_s16_le(0x90)
-        self.dig_P3 = self.read_s16_le(0x92)
-        self.dig_P4 = self.read_s16_le(0x94)
-        self.dig_P5 = self.read_s16_le(0x96)
-        self.dig_P6 = self.read_s16_le(0x98)
-        self.dig_P7 = self.read_s16_le(0x9A)
-        self.dig_P8 = self.read_s16_le(0x9C)
-        self.dig_P9 = self.read_s16_le(0x9E)
-
-        self.dig_H1 = self.read_u8(0xA1)
-        # Humidity calibration (0xE1..0xE7)
-        self.dig_H2 = self.read_s16_le(0xE1)
-        self.dig_H3 = self.read_u8(0xE3)
-        e4 = self.read_u8(0xE4)
-        e5 = self.read_u8(0xE5)
-        e6 = self.read_u8(0xE6)
-        self.dig_H4 = (e4 << 4) | (e5 & 0x0F)
-        self.dig_H5 = (e6 << 4) | (e5 >> 4)
-        self.dig_H6 = self.read_u8(0xE7)
-        if self.dig_H6 > 127:
-            self.dig_H6 -= 256
-
-    # --- Compensation formulas (from Bosch datasheet) ---
+        # Two bursts: temperature/pressure (0x88..0xA1) and humidity (0xE1..0xE7)
+        tp = self.spi.xfer2(_CALIB_TP_TX)[1:]
+        h = self.spi.xfer2(_CALIB_H_TX)[1:]
+        self.calib = BME280Calibration.from_registers(bytes(tp), bytes(h))
+
+    # --- calibration cache ---
+    def _cache_key(self, chip_id) -> str:
+        return f"spi{self.bus}.{self.device}:{chip_id:02x}"
+
+    def _read_cache(self) -> dict:
+        try:
+            with open(self.calib_cache) as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _load_calibration(self, chip_id) -> None:
+        if self.calib_cache:
+            entry = self._read_cache().get(self._cache_key(chip_id))
+            if entry:
+                try:
+                    calib = BME280Calibration.from_dict(entry)
+                    check = bytes(self.read_bytes(CALIB_TP_REG, _CALIB_CHECK_LEN))
+                    if check == calib.to_registers()[0][:_CALIB_CHECK_LEN]:
+                        self.calib = calib
+                        self.calib_from_cache = True
+                        return
+                except Exception:
+                    pass
+
+        self._read_calibration()
+        if self.calib_cache:
+            self._write_cache(chip_id)
+
+    def _write_cache(self, chip_id) -> None:
+        try:
+            cache = self._read_cache()
+            cache[self._cache_key(chip_id)] = self.calib.to_dict()
+            os.makedirs(os.path.dirname(self.calib_cache) or ".", exist_ok=True)
+            tmp = self.calib_cache + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmp, self.calib_cache)
+        except Exception:
+            pass  # cache is an optimisation only
+
+    # --- Compensation (formulas live in bme280_compensation, shared with the batch path) ---
     def _compensate_temperature(self, adc_T):
-        var1 = (adc_T / 16384.0 - self.dig_T1 / 1024.0) * self.dig_T2
-        var2 = ((adc_T / 131072.0 - self.dig_T1 / 8192.0) ** 2) * self.dig_T3
-        self.t_fine = int(var1 + var2)
-        return (var1 + var2) / 5120.0
+        temp_c, self.t_fine = compensate_temperature(self.calib, adc_T)
+        return temp_c
 
     def _compensate_pressure(self, adc_P):
-        var1 = self.t_fine / 2.0 - 64000.0
-        var2 = var1 * var1 * self.dig_P6 / 32768.0
-        var2 = var2 + var1 * self.dig_P5 * 2.0
-        var2 = var2 / 4.0 + self.dig_P4 * 65536.0
-        var1 = (self.dig_P3 * var1 * var1 / 524288.0 + self.dig_P2 * var1) / 524288.0
-        var1 = (1.0 + var1 / 32768.0) * self.dig_P1
-        if var1 == 0:
-            return 0.0
-        p = 1048576.0 - adc_P
-        p = (p - var2 / 4096.0) * 6250.0 / var1
-        var1 = self.dig_P9 * p * p / 2147483648.0
-        var2 = p * self.dig_P8 / 32768.0
-        p = p + (var1 + var2 + self.dig_P7) / 16.0
-        # p is Pa; convert to hPa/mb
-        return p / 100.0
+        return compensate_pressure(self.calib, adc_P, self.t_fine)
 
     def _compensate_humidity(self, adc_H):
-        h = self.t_fine - 76800.0
-        if h == 0:
-            return 0.0
-        h = (adc_H - (self.dig_H4 * 64.0 + self.dig_H5 / 16384.0 * h)) * (
-            self.dig_H2 / 65536.0 * (1.0 + self.dig_H6 / 67108864.0 * h * (1.0 + self.dig_H3 / 67108864.0 * h))
-        )
-        h = h * (1.0 - self.dig_H1 * h / 524288.0)
-        return max(0.0, min(100.0, h))
-
-    def read(self) -> BME280Reading:
-        data = self.read_bytes(REG_PRESS_MSB, 8)
+        return compensate_humidity(self.calib, adc_H, self.t_fine)
+
+    def read(self) -> Optional[BME280Reading]:
+        """
+        A new sample, or None if no conversion has completed since the last one.
+        Forced mode after trigger() never blocks: None while the conversion is
+        still running, with pending() saying when to look again.
+        """
+        if self.mode == "forced":
+            if self._forced_due is None:
+                # nobody triggered: do the whole conversion here, sleeping out
+                # the datasheet max time, then confirm via status
+                due = self.trigger()
+                wait = due - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                self._forced_due = None
+                self._wait_idle(self.measure_s * 2)
+            else:
+                now = time.monotonic()
+                if now < self._forced_due:
+                    return None
+                if self.read_u8(REG_STATUS) & (STATUS_MEASURING | STATUS_IM_UPDATE):
+                    if now >= self._forced_deadline:
+                        self._forced_due = None
+                        raise TimeoutError("BME280 conversion did not finish")
+                    self._forced_due = now + FORCED_RETRY_S
+                    return None
+                self._forced_due = None
+            data = self.read_bytes(REG_PRESS_MSB, 8)
+        else:
+            data = self._read_normal()
+            if data is None:
+                return None
 
         adc_P = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
         adc_T = (data[3] << 12) | (data[4] << 4) | (data[5] >> 4)
@@ -137,7 +306,38 @@ class BME280SPI:
         pressure_mb = self._compensate_pressure(adc_P)
         humidity_pct = self._compensate_humidity(adc_H)
 
-        return BME280Reading(temp_c, humidity_pct, pressure_mb)
+        return BME280Reading(temp_c, humidity_pct, pressure_mb, (adc_T, adc_P, adc_H))
+
+    def _read_normal(self):
+        """
+        The data burst if a conversion has completed since the last one we
+        returned, else None. A completion shows as the status measuring bit
+        going 1 -> 0 between polls, or as the data registers changing (a
+        conversion usually ends between two polls, so the bit is rarely seen).
+        """
+        now = time.monotonic()
+        if now < self._not_before:
+            return None  # can't have finished another conversion yet
+        status = self.read_u8(REG_STATUS)
+        if status & STATUS_IM_UPDATE:
+            return None
+        # data registers are shadowed during a conversion, so this burst is always consistent
+        data = self.read_bytes(REG_PRESS_MSB, 8)
+
+        measuring = bool(status & STATUS_MEASURING)
+        finished = self._saw_measuring and not measuring
+        self._saw_measuring = measuring
+        last_poll, self._last_poll = self._last_poll, now
+        if data == self._last_burst and not finished:
+            if measuring:
+                self._not_before = now + self.measure_s
+            return None
+
+        # this conversion ended after the previous poll, so the next one ends
+        # at least a period after that
+        self._last_burst = data
+        self._not_before = last_poll + self._period_s
+        return data
 
     def close(self):
         self.spi.close()
@@ -1,20 +1,22 @@
 #!/usr/bin/env python3
+import sys
 import time
-from datetime import datetime, date, timedelta
+from bisect import bisect_right
+from datetime import datetime, date, time as dtime, timedelta
 from zoneinfo import ZoneInfo
 
 from astral import LocationInfo
 from astral.sun import sun
 
+from backlight import Backlight
+
 TZ = ZoneInfo("Europe/London")
 
 # Market Deeping-ish
 LAT = 52.67654
 LON = -0.31629
 
-# Backlight control
-BRIGHTNESS_PATH = "/sys/class/backlight/10-0045/brightness"
-BL_POWER_PATH   = "/sys/class/backlight/10-0045/bl_power"
+# Backlight control: sysfs paths live in backlight.py (display_app watches the same bl_power)
 
 # Your policy
 OFF_START = (0, 30)   # 00:30
@@ -27,97 +29,114 @@ RAMP_MINUTES   = 60
 # Summer shortcut: if sunrise is before this, just go 100% immediately
 SUMMER_EARLY_SUNRISE_CUTOFF = (5, 30)  # 05:30
 
-def hhmm_today(h, m):
-    now = datetime.now(TZ)
-    return now.replace(hour=h, minute=m, second=0, microsecond=0)
-
-def write_int(path, value):
-    with open(path, "w") as f:
-        f.write(str(int(value)))
+# Never sleep longer than this, so a clock jump (NTP at boot, no RTC) is caught
+MAX_SLEEP_SECONDS = 600
 
-def set_backlight(on: bool):
-    # 0 = on, 1 = off (Pi backlight driver convention)
-    write_int(BL_POWER_PATH, 0 if on else 1)
+def at(day, hm):
+    return datetime.combine(day, dtime(*hm), tzinfo=TZ)
 
-def set_brightness_pct(pct: float):
+def to_level(pct: float) -> int:
     pct = max(0.0, min(1.0, pct))
     # official backlight is typically 0..255
-    value = round(pct * 255)
-    write_int(BRIGHTNESS_PATH, value)
+    return round(pct * 255)
+
+def ramp_steps(start, end, from_pct, to_pct):
+    """
+    (time, level) for every integer level step of a linear ramp, i.e. the
+    exact moments round(pct * 255) changes, so the fade is as smooth as the
+    hardware allows and nothing is written in between.
+    """
+    a, b = to_level(from_pct), to_level(to_pct)
+    if a == b:
+        return []
+    span = (end - start).total_seconds()
+    d = 1 if b > a else -1
+    steps = []
+    for lvl in range(a + d, b + d, d):
+        edge = (lvl - 0.5 * d) / 255.0  # pct where rounding flips to lvl
+        t = (edge - from_pct) / (to_pct - from_pct)
+        steps.append((start + timedelta(seconds=span * min(1.0, max(0.0, t))), lvl))
+    return steps
+
+class DaySchedule:
+    """
+    The whole day's backlight curve, worked out once after sun():
+    times[i] is when state[i] = (on, level) starts. Level is None while off
+    (the brightness isn't touched in the overnight window).
+    """
+
+    def __init__(self, loc, day: date):
+        self.day = day
+        s = sun(loc.observer, date=day, tzinfo=TZ)
+        sunrise = s["sunrise"]
+        sunset = s["sunset"]
 
-def lerp(a, b, t):
-    return a + (b - a) * t
+        # Morning rule
+        if sunrise <= at(day, SUMMER_EARLY_SUNRISE_CUTOFF):
+            # summer: don't bother with gentle dawn theatrics
+            morning_from = 1.0
+        else:
+            morning_from = MORNING_START
 
-def ramp(now, start, end, from_pct, to_pct):
-    if now <= start:
-        return from_pct
-    if now >= end:
-        return to_pct
-    span = (end - start).total_seconds()
-    t = (now - start).total_seconds() / span
-    return lerp(from_pct, to_pct, t)
+        # before sunrise: low but visible; after the evening ramp hold until the off window
+        ramp = timedelta(minutes=RAMP_MINUTES)
+        steps = [(at(day, (0, 0)), to_level(morning_from))]
+        steps += ramp_steps(sunrise, sunrise + ramp, morning_from, 1.0)
+        steps += ramp_steps(sunset, sunset + ramp, 1.0, EVENING_TARGET)
+        step_times = [t for t, _ in steps]
+
+        off_start = at(day, OFF_START)
+        off_end = at(day, OFF_END)
+
+        self.times = []
+        self.states = []
+        for t in sorted(set(step_times) | {off_start, off_end}):
+            if off_start <= t < off_end:
+                state = (False, None)
+            else:
+                state = (True, steps[bisect_right(step_times, t) - 1][1])
+            if not self.states or self.states[-1] != state:
+                self.times.append(t)
+                self.states.append(state)
+
+    def state_at(self, now):
+        i = bisect_right(self.times, now) - 1
+        return self.states[max(i, 0)]
+
+    def next_change(self, now):
+        """Time of the next state change today, or None if there isn't one."""
+        i = bisect_right(self.times, now)
+        return self.times[i] if i < len(self.times) else None
+
+def print_schedule(schedule):
+    for t, (on, level) in zip(schedule.times, schedule.states):
+        print(t.strftime("%H:%M:%S"), f"{level / 255:4.0%} ({level})" if on else "off")
 
 def main():
     loc = LocationInfo(name="Market Deeping", region="UK", timezone="Europe/London",
                        latitude=LAT, longitude=LON)
 
-    last_day = None
-    s_today = None
+    if "--schedule" in sys.argv[1:]:
+        print_schedule(DaySchedule(loc, datetime.now(TZ).date()))
+        return
+
+    backlight = Backlight()
+    schedule = None
 
     while True:
         now = datetime.now(TZ)
 
-        # Recompute sun times once per day
-        if last_day != now.date():
-            s_today = sun(loc.observer, date=now.date(), tzinfo=TZ)
-            last_day = now.date()
-
-        off_start = hhmm_today(*OFF_START)
-        off_end = hhmm_today(*OFF_END)
+        # Recompute the curve once per day
+        if schedule is None or schedule.day != now.date():
+            schedule = DaySchedule(loc, now.date())
 
-        # Overnight off window
-        if off_start <= now < off_end:
-            set_backlight(False)
-            time.sleep(20)
-            continue
-
-        # Otherwise: backlight on
-        set_backlight(True)
-
-        sunrise = s_today["sunrise"]
-        sunset = s_today["sunset"]
-
-        # Morning rule
-        early_cutoff = hhmm_today(*SUMMER_EARLY_SUNRISE_CUTOFF)
-        if sunrise <= early_cutoff:
-            # summer: don't bother with gentle dawn theatrics
-            morning_from = 1.0
-        else:
-            morning_from = MORNING_START
-
-        morning_start = sunrise
-        morning_end = sunrise + timedelta(minutes=RAMP_MINUTES)
-
-        evening_start = sunset
-        evening_end = sunset + timedelta(minutes=RAMP_MINUTES)
-
-        # Decide brightness
-        if now < morning_start:
-            # before sunrise: low but visible
-            pct = morning_from
-        elif morning_start <= now <= morning_end:
-            pct = ramp(now, morning_start, morning_end, morning_from, 1.0)
-        elif morning_end < now < evening_start:
-            pct = 1.0
-        elif evening_start <= now <= evening_end:
-            pct = ramp(now, evening_start, evening_end, 1.0, EVENING_TARGET)
-        else:
-            # after evening ramp: hold at 50% until off window
-            pct = EVENING_TARGET
+        on, level = schedule.state_at(now)
+        backlight.apply(on, level)
 
-        #print("Setting to " + str(pct*100) + "%")
-        set_brightness_pct(pct)
-        time.sleep(20)
+        # Sleep exactly until the next step (or midnight); wall-clock maths via timestamps so DST is fine
+        nxt = schedule.next_change(now) or at(now.date() + timedelta(days=1), (0, 0))
+        delay = nxt.timestamp() - time.time()
+        time.sleep(min(max(delay, 0.01), MAX_SLEEP_SECONDS))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,104 @@
+import math
+from collections import deque
+
+import pygame
+
+
+class Sparkline:
+    """
+    Fixed-width history chart kept on a persistent off-screen surface.
+
+    The x axis is `span_seconds` of buckets, newest on the right. push()
+    with a new bucket scrolls the surface left by the elapsed columns and
+    draws just the newest segment, so the cost per update is constant no
+    matter how long the history is, and nothing at all happens between
+    buckets. Feed it rollups (e.g. the store's 15m tier), not raw samples.
+
+    The y range only ever grows: a value outside it triggers one full
+    redraw from the kept bucket values (rare), everything else is incremental.
+    version changes whenever the surface does; use it as the Compositor token.
+    """
+
+    def __init__(self, width: int, height: int, bucket_seconds: int, span_seconds: int = 86400,
+                 value_range=(0.0, 100.0), colour_fn=None, background=(0, 0, 0),
+                 colour=(245, 245, 245), line_width: int = 2):
+        self.bucket_seconds = bucket_seconds
+        self.n = max(2, span_seconds // bucket_seconds)
+        self.col_w = max(1, width // self.n)
+        self.width = self.col_w * self.n
+        self.height = height
+        self.lo, self.hi = value_range
+        self.colour_fn = colour_fn
+        self.colour = colour
+        self.background = background
+        self.line_width = line_width
+
+        self.surface = pygame.Surface((self.width, height))
+        self.surface.fill(background)
+        self.values = deque(maxlen=self.n)  # (bucket, value or None)
+        self.last_bucket = None
+        self.version = 0
+
+    # --- geometry ---
+    def _x(self, bucket: int) -> int:
+        """Centre of a bucket's column; the newest bucket is the rightmost column."""
+        return self.width - self.col_w * (self.last_bucket - bucket) - self.col_w // 2 - 1
+
+    def _y(self, v: float) -> int:
+        pad = self.line_width
+        frac = (v - self.lo) / ((self.hi - self.lo) or 1.0)
+        return int(round(self.height - pad - frac * (self.height - 2 * pad)))
+
+    def _segment(self, prev, cur) -> None:
+        b1, v1 = cur
+        if v1 is None:
+            return
+        colour = self.colour_fn(v1) if self.colour_fn is not None else self.colour
+        x1, y1 = self._x(b1), self._y(v1)
+        if prev is not None and prev[1] is not None and prev[0] == b1 - 1:
+            pygame.draw.line(self.surface, colour, (self._x(prev[0]), self._y(prev[1])), (x1, y1),
+                             self.line_width)
+        else:
+            # isolated point (after a gap): a short stroke so it's still visible
+            pygame.draw.line(self.surface, colour, (x1 - self.col_w // 2, y1), (x1, y1), self.line_width)
+
+    # --- updates ---
+    def push(self, t: float, value) -> bool:
+        """Add the value for the bucket containing t. Older/duplicate buckets are ignored."""
+        b = int(t) // self.bucket_seconds
+        if self.last_bucket is not None and b <= self.last_bucket:
+            return False
+        if value is not None and (isinstance(value, float) and math.isnan(value)):
+            value = None
+
+        rescale = value is not None and not (self.lo <= value <= self.hi)
+        if rescale:
+            margin = (self.hi - self.lo) * 0.1
+            self.lo = min(self.lo, value - margin)
+            self.hi = max(self.hi, value + margin)
+
+        prev = self.values[-1] if self.values else None
+        shift = self.n if self.last_bucket is None else b - self.last_bucket
+        self.last_bucket = b
+        self.values.append((b, value))
+
+        if rescale:
+            self.redraw()
+        else:
+            dx = min(shift, self.n) * self.col_w
+            self.surface.scroll(-dx, 0)
+            self.surface.fill(self.background, pygame.Rect(self.width - dx, 0, dx, self.height))
+            self._segment(prev, (b, value))
+        self.version += 1
+        return True
+
+    def redraw(self) -> None:
+        """Full repaint from the kept values (first fill, or after a range change)."""
+        self.surface.fill(self.background)
+        oldest = self.last_bucket - self.n + 1 if self.last_bucket is not None else 0
+        prev = None
+        for item in self.values:
+            if item[0] >= oldest:
+                self._segment(prev, item)
+            prev = item
+        self.version += 1
@@ -0,0 +1,259 @@
+"""
+Every sensor on one acquisition thread.
+
+SensorHub services any number of SDS011 serial ports and BME280 SPI
+devices from a single selectors loop instead of one thread per device:
+
+  - serial ports are registered with the selector and read (non-blocking)
+    only when bytes have actually arrived
+  - BME280s sit on a timer heap keyed by next_sample_due(); in forced mode
+    a conversion is triggered, and collected measure_s later on its own
+    timer (rescheduled, not waited on, if it is still busy), so one
+    sensor's conversion never holds up the others
+  - a device that fails is closed and reopened later on the same heap
+
+Results are published as acquisition.Snapshot objects, same as
+SourceWorker, so readers never wait on hardware:
+
+  hub.sources[name]                latest snapshot from a configured device
+  hub.devices["sds011:A1B2"]       latest snapshot per device ID: ID1/ID2 from
+                                   the SDS011 frame (as on the label), or
+                                   "spi<bus>.<cs>" for a BME280
+  hub.device_ids[name]             the device ID last seen for that source
+"""
+import heapq
+import os
+import selectors
+import threading
+import time
+from typing import Dict, Optional
+
+from acquisition import Snapshot
+from bme280_sensor import BME280Sensor
+from metrics import REGISTRY
+from sds011 import SDS011
+
+MAX_SELECT_SECONDS = 1.0
+BME_INTERVAL = 1.0  # seconds between BME280 samples
+
+
+def sds011_tag(device_id: int) -> str:
+    """Device ID as printed on the SDS011 label, e.g. 'A1B2'."""
+    return f"{device_id:04X}"
+
+
+class SensorHub(threading.Thread):
+    """
+    add_sds011() / add_bme280() before start(). on_update(snapshot) is
+    called from the hub thread when a source's value changes.
+    """
+
+    def __init__(self, on_update=None, retry_seconds: float = 10.0):
+        super().__init__(name="sensor-hub", daemon=True)
+        self.on_update = on_update
+        self.retry_seconds = retry_seconds
+
+        self.sources: Dict[str, Snapshot] = {}
+        self.devices: Dict[str, Snapshot] = {}
+        self.device_ids: Dict[str, str] = {}
+        self.kinds: Dict[str, str] = {}          # name -> "sds011" / "bme280"
+        self.sds: Dict[str, Optional[SDS011]] = {}
+        self.bme: Dict[str, BME280Sensor] = {}
+
+        self._ports = {}
+        self._filters = {}
+        self._seq = {}
+        self._timers = []   # (monotonic due, tiebreak, fn, arg)
+        self._bme_started = {}
+        self._tiebreak = 0
+        self._read_time = {}
+        self._read_errors = {}
+
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        self._sel.register(self._wake_r, selectors.EVENT_READ, None)
+        self._stop_event = threading.Event()
+
+    # --- registry ---
+    def _add(self, name: str, kind: str) -> None:
+        if name in self.kinds:
+            raise ValueError(f"duplicate device name {name!r}")
+        self.kinds[name] = kind
+        self._seq[name] = 0
+        self._read_time[name] = REGISTRY.histogram(
+            "aq_source_read_seconds", "Time spent in one source read", labels={"source": name})
+        self._read_errors[name] = REGISTRY.counter(
+            "aq_source_read_errors_total", "Source reads that raised", labels={"source": name})
+
+    def add_sds011(self, name: str, port: str, filters=None) -> None:
+        """filters: optional (pm25, pm10) analytics.SpikeFilter pair, applied to every frame."""
+        self._add(name, "sds011")
+        self._ports[name] = port
+        self._filters[name] = filters
+        self.sds[name] = None
+        self._at(0.0, self._open_sds, name)
+
+    def add_bme280(self, name: str, bus: int = 0, device: int = 0, raw_log=None, **acquisition) -> None:
+        self._add(name, "bme280")
+        self.bme[name] = BME280Sensor(retry_seconds=self.retry_seconds, bus=bus, device=device,
+                                      raw_log=raw_log, **acquisition)
+        self._at(0.0, self._sample_bme, name)
+
+    def snapshot(self, name: str) -> Optional[Snapshot]:
+        return self.sources.get(name)
+
+    # --- timers ---
+    def _at(self, due: float, fn, arg) -> None:
+        self._tiebreak += 1
+        heapq.heappush(self._timers, (due, self._tiebreak, fn, arg))
+
+    # --- publishing ---
+    def _publish(self, name: str, value, tag: Optional[str] = None) -> None:
+        prev = self.sources.get(name)
+        self._seq[name] += 1
+        snap = Snapshot(value, time.time(), self._seq[name])
+        self.sources[name] = snap
+        if tag is not None:
+            self.device_ids[name] = tag
+            self.devices[f"{self.kinds[name]}:{tag}"] = snap
+        if self.on_update is not None and (prev is None or prev.value != value):
+            try:
+                self.on_update(snap)
+            except Exception:
+                pass
+
+    # --- SDS011 ---
+    def _open_sds(self, name: str) -> None:
+        sds = None
+        try:
+            # timeout=0: read() returns whatever has arrived, never blocks the loop
+            sds = SDS011(self._ports[name], timeout=0)
+            self._sel.register(sds.ser.fileno(), selectors.EVENT_READ, name)
+        except Exception:
+            if sds is not None:
+                try:
+                    sds.close()  # opened but couldn't be registered; don't leak the port
+                except Exception:
+                    pass
+            self._read_errors[name].inc()
+            self._at(time.monotonic() + self.retry_seconds, self._open_sds, name)
+            return
+        self.sds[name] = sds
+
+    def _close_sds(self, name: str) -> None:
+        sds = self.sds.get(name)
+        if sds is None:
+            return
+        try:
+            self._sel.unregister(sds.ser.fileno())
+        except Exception:
+            pass
+        sds.close()
+        self.sds[name] = None
+
+    def _read_sds(self, name: str) -> None:
+        sds = self.sds[name]
+        t0 = time.perf_counter()
+        try:
+            frames = sds.read_all()
+        except Exception:
+            # unplugged: pyserial raises once the fd reports EOF
+            self._read_errors[name].inc()
+            self._close_sds(name)
+            self._at(time.monotonic() + self.retry_seconds, self._open_sds, name)
+            return
+        self._read_time[name].observe(time.perf_counter() - t0)
+        if not frames:
+            return
+        sds.parser.dropped_frames += len(frames) - 1
+        filters = self._filters[name]
+        if filters is not None:
+            # every frame goes through the filter so its window sees the real sample rate
+            for f in frames:
+                value = (filters[0].filter(f.pm25), filters[1].filter(f.pm10))
+        else:
+            value = (frames[-1].pm25, frames[-1].pm10)
+        self._publish(name, value, sds011_tag(frames[-1].device_id))  # latest wins
+
+    # --- BME280 ---
+    def _sample_bme(self, name: str) -> None:
+        bme = self.bme[name]
+        self._bme_started[name] = time.monotonic()
+        due = bme.trigger()
+        if due is not None:
+            # forced conversion running; collect it when it's done
+            self._at(due, self._collect_bme, name)
+        else:
+            self._collect_bme(name)
+
+    def _collect_bme(self, name: str) -> None:
+        bme = self.bme[name]
+        t0 = time.perf_counter()
+        try:
+            t, h, p = bme.read()
+        except Exception:
+            t = h = p = None
+            self._read_errors[name].inc()
+        self._read_time[name].observe(time.perf_counter() - t0)
+        if t is None and h is None and p is None:
+            due = bme.pending()
+            if due is not None:
+                # forced conversion still running: look again later rather than wait on this thread
+                self._at(due, self._collect_bme, name)
+                return
+        else:
+            self._publish(name, (t, h, p), f"spi{bme.bus}.{bme.device}")
+
+        # steady cadence, or later if the sensor says so (normal-mode standby, reinit backoff)
+        self._at(max(self._bme_started[name] + BME_INTERVAL, bme.next_sample_due()), self._sample_bme, name)
+
+    # --- loop ---
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            timeout = MAX_SELECT_SECONDS
+            if self._timers:
+                timeout = min(timeout, max(0.0, self._timers[0][0] - time.monotonic()))
+
+            for key, _ in self._sel.select(timeout):
+                if key.data is None:
+                    try:
+                        os.read(self._wake_r, 64)
+                    except OSError:
+                        pass
+                    continue
+                if self.sds.get(key.data) is not None:
+                    try:
+                        self._read_sds(key.data)
+                    except Exception:
+                        self._read_errors[key.data].inc()  # e.g. a filter or on_update raised
+
+            now = time.monotonic()
+            while self._timers and self._timers[0][0] <= now:
+                _, _, fn, arg = heapq.heappop(self._timers)
+                try:
+                    fn(arg)
+                except Exception:
+                    # one device's failure mustn't end the thread; every timer
+                    # callback reschedules itself last, so run it again later
+                    self._read_errors[arg].inc()
+                    self._at(now + self.retry_seconds, fn, arg)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop_event.set()
+        try:
+            os.write(self._wake_w, b"x")
+        except OSError:
+            pass
+        if timeout is not None:
+            self.join(timeout)
+
+    def close(self) -> None:
+        for name in list(self.sds):
+            self._close_sds(name)
+        self._sel.close()
+        for fd in (self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
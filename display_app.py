@@ -74,23 +74,78 @@ WantedBy=default.target
 
 # WHILE WORKING ON THE CODE, LOAD WITH...
 # DISPLAY=:0 XAUTHORITY=/home/pi/.Xauthority python3 display_app.py
+# HEADLESS (no screen attached): acquisition + storage only, pygame is never imported
+# python3 display_app.py --headless
+import os
+import signal
+import socket
+import sys
+import threading
 import time
-import pygame
 import math
-from bbc_weather import BBCOutsideTemp
-from sds011 import SDS011
-from bme280_sensor import BME280Sensor
+from bisect import bisect_left, bisect_right
+from metrics import REGISTRY
+from pipeline import Pipeline
 
 BBC_LOCATION_ID = "2643029"
 
 # ---- Screen ----
-WIDTH, HEIGHT = 800, 480
-FPS = 10
+WIDTH, HEIGHT = 800, 480  # mode to ask for; layout.json is compiled for the size we actually get
+COALESCE_MS = 50  # merge redraw requests that land this close together
 
 BLACK = (0, 0, 0)
 WHITE = (245, 245, 245)
 
 SDS_PORT = "/dev/serial/by-id/usb-1a86_USB_Serial-if00-port0"
+
+# ---- Sensors ----
+# name -> port / (spi bus, chip select). The first of each kind drives the dashboard;
+# any others are logged to STORE_DIR/devices/<name> and served by the API/uplink.
+# SDS011 readings are also tagged with the sensor's own ID (as printed on its label).
+SDS011_DEVICES = {
+    "indoor": SDS_PORT,
+    # "outdoor": "/dev/serial/by-id/usb-1a86_USB_Serial-if01-port0",
+}
+BME280_DEVICES = {
+    "indoor": (0, 0),      # CE0
+    # "outdoor": (0, 1),   # CE1
+}
+
+# Single-frame PM spikes (insects, steam, garbage that passes the checksum) are
+# replaced by the median of the last `window` frames; a real change gets through
+# once it fills half the window. None to store/display the raw frames.
+SPIKE_FILTER = {
+    "pm25": dict(window=15, threshold=4.0, min_delta=5.0),
+    "pm10": dict(window=15, threshold=4.0, min_delta=8.0),
+}
+
+# ---- Metrics (Prometheus text format) ----
+METRICS_TEXTFILE = None                 # e.g. "/var/lib/node_exporter/textfile_collector/airquality.prom"
+METRICS_HTTP = ("127.0.0.1", 9108)      # GET /metrics; None to disable, "" host to expose on the LAN
+
+# ---- LAN JSON API (GET /api/current, /api/history) ----
+API_HTTP = ("", 8080)                   # None to disable, "127.0.0.1" host for this machine only
+
+# ---- Telemetry uplink to a central collector ----
+UPLINK_URL = None                       # e.g. "http://collector.local:8081/ingest" or "mqtt://broker/airquality"
+UPLINK_BATCH_SECONDS = 60
+DEVICE_ID = socket.gethostname()
+
+# Set AQ_SIMULATE=1 to run against hwsim's emulated SDS011 + BME280 (no Pi needed)
+SIMULATE = os.environ.get("AQ_SIMULATE") == "1"
+
+# BME280: forced mode sleeps the sensor between our 1 Hz reads, which keeps
+# self-heating from skewing the inside temperature (datasheet "weather monitoring").
+BME_ACQUISITION = dict(mode="forced", osrs_t=1, osrs_p=1, osrs_h=1, iir_filter=0)
+# ---- Storage ----
+STORE_DIR = os.path.expanduser("~/.local/share/airquality")
+STORE_FLUSH_SECONDS = 60  # msync the maps this often (they're written continuously)
+STALE_SECONDS = 10        # a sensor snapshot older than this is stored as missing
+
+# Air quality indices are defined on rolling means, not instantaneous values.
+# Band the colour/status on this window ("15m", "1h", "24h"), or None for live.
+AQ_BAND_WINDOW = "1h"
+
 UGM3 = "µg/m³"  # proper µ and superscript 3
 
 def clamp(x, lo, hi):
@@ -130,42 +185,37 @@ def quality_colour(value: float, kind: str):
         return lerp_rgb(red, dark_red, (v - b3) / (b4 - b3))
     return dark_red
 
+# Upper bound (inclusive) of each quality band; above the last one is "Really Bad".
+# backfill.py recomputes history from these, so change them here and re-run it.
+PM_BANDS = {
+    "pm25": (10, 20, 35, 50, 100, 225),
+    "pm10": (20, 40, 50, 100, 150, 300),
+}
+QUALITY_LABELS = ("Excellent", "Good", "Fair", "Poor", "Very Poor", "Bad", "Really Bad")
+
 def quality_label(value: float, kind: str):
-    if kind == "pm25":
-        if value <= 10: return "Excellent"
-        if value <= 20: return "Good"
-        if value <= 35: return "Fair"
-        if value <= 50: return "Poor"
-        if value <= 100: return "Very Poor"
-        if value <= 225: return "Bad"
-        return "Really Bad"
-    else:
-        if value <= 20: return "Excellent"
-        if value <= 40: return "Good"
-        if value <= 50: return "Fair"
-        if value <= 100: return "Poor"
-        if value <= 150: return "Very Poor"
-        if value <= 300: return "Bad"
-        return "Really Bad"
-
-def render_aq_block(screen, label_font, value_font, status_font, x, y, label, value, kind):
-    lbl = label_font.render(label, True, WHITE)
-    screen.blit(lbl, (x, y))
+    bands = PM_BANDS["pm25"] if kind == "pm25" else PM_BANDS["pm10"]
+    return QUALITY_LABELS[bisect_left(bands, value)]
 
+def aq_value_text(reading):
+    """
+    reading is (kind, live value, band value). The number is the live value;
+    colour and status are banded on the band value (a rolling mean) when
+    there is one, else on the live value itself.
+    """
+    kind, value, band_value = reading
     if value is None:
-        val_text = f"-- {UGM3}"
-        colour = WHITE
-        status = "--"
-    else:
-        colour = quality_colour(value, kind)
-        val_text = f"{value:.0f}{UGM3}" if value >= 10 else f"{value:.1f}{UGM3}"
-        status = quality_label(value, kind)
-
-    val = value_font.render(val_text, True, colour)
-    screen.blit(val, (x, y + 30))
+        return f"-- {UGM3}", WHITE
+    colour = quality_colour(value if band_value is None else band_value, kind)
+    return (f"{value:.0f}{UGM3}" if value >= 10 else f"{value:.1f}{UGM3}"), colour
 
-    st = status_font.render(status, True, colour)
-    screen.blit(st, (x, y + 100))
+def aq_status_text(reading):
+    kind, value, band_value = reading
+    if value is None:
+        return "--", WHITE
+    if band_value is None:
+        band_value = value
+    return quality_label(band_value, kind), quality_colour(band_value, kind)
 
 def temp_to_colour(temp_c: float):
     deep_blue = (30, 120, 255)
@@ -188,40 +238,50 @@ def temp_to_colour(temp_c: float):
 
 # For air pressure analysis...
 SUBTLE = (180, 180, 180)  # soft grey for subtle insights
-PRESSURE_HISTORY_SECONDS = 30 * 60   # 30 minutes
-PRESSURE_SAMPLE_MIN_GAP = 20         # don't store more often than every 20s
+PRESSURE_TREND_STEADY = 0.5   # mb/h; slower than this is "steady"
+PRESSURE_TREND_FAST = 2.0     # mb/h; faster is proper movement
+PRESSURE_TREND_LABELS = (
+    "Steady – Settled",
+    "Rising slowly – Improving",
+    "Falling slowly – Changeable",
+    "Rising – Fair weather likely",
+    "Falling – Rain likely",
+)
+
+def pressure_trend_code(slope_mbph):
+    """Index into PRESSURE_TREND_LABELS."""
+    abs_s = abs(slope_mbph)
+    if abs_s < PRESSURE_TREND_STEADY:
+        return 0
+    falling = 0 if slope_mbph > 0 else 1
+    if abs_s < PRESSURE_TREND_FAST:
+        return 1 + falling
+    return 3 + falling
 
 def pressure_trend_text(history):
     """
-    history: list of (timestamp, pressure_mb)
+    history: RollingRegression of (timestamp, pressure_mb)
     Returns (text, colour) where colour is subtle grey.
     """
     if len(history) < 6:
         return ("Trend: --", SUBTLE)
 
-    # Simple slope (mb per hour) using endpoints to keep it cheap
-    t0, p0 = history[0]
-    t1, p1 = history[-1]
-    dt = t1 - t0
-    if dt < 60:
+    # Least-squares slope (mb per hour) over the whole window, O(1) to read
+    if history.span() < 60:
         return ("Trend: --", SUBTLE)
 
-    slope_mbps = (p1 - p0) / dt
+    slope_mbps = history.slope()
+    if slope_mbps is None:
+        return ("Trend: --", SUBTLE)
     slope_mbph = slope_mbps * 3600.0
 
     # Categorise
-    abs_s = abs(slope_mbph)
-    if abs_s < 0.5:
-        return ("Steady – Settled", SUBTLE)
+    return (PRESSURE_TREND_LABELS[pressure_trend_code(slope_mbph)], SUBTLE)
 
-    rising = slope_mbph > 0
-    if abs_s < 2.0:
-        return (("Rising slowly – Improving" if rising else "Falling slowly – Changeable"), SUBTLE)
+# Feedback on humidity levels: dew point (C) below each bound gets that label.
+DEW_POINT_BANDS = (5, 10, 15, 18, 21)
+COMFORT_LABELS = ("Crisp – Dry air", "Fresh – Comfortable", "Comfortable", "Slightly humid", "Muggy", "Oppressive")
 
-    # Proper movement
-    return (("Rising – Fair weather likely" if rising else "Falling – Rain likely"), SUBTLE)
-
-# Feedback on humidity levels.
 def dew_point_c(temp_c, humidity_pct):
     a = 17.62
     b = 243.12
@@ -232,212 +292,268 @@ def comfort_text(temp_c, humidity_pct):
     if temp_c is None or humidity_pct is None:
         return "Comfort: --"
 
-    dp = dew_point_c(temp_c, humidity_pct)
-
-    if dp < 5:
-        return "Crisp – Dry air"
-    if dp < 10:
-        return "Fresh – Comfortable"
-    if dp < 15:
-        return "Comfortable"
-    if dp < 18:
-        return "Slightly humid"
-    if dp < 21:
-        return "Muggy"
-    return "Oppressive"
-
-
-def main():
-    pygame.init()
-    pygame.mouse.set_visible(False)
+    return COMFORT_LABELS[bisect_right(DEW_POINT_BANDS, dew_point_c(temp_c, humidity_pct))]
 
-    screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.FULLSCREEN)
-    clock = pygame.time.Clock()
-
-    # Fonts (created once, not every frame)
-    aq_label_font = pygame.font.SysFont("DejaVu Sans", 28)
-    aq_value_font = pygame.font.SysFont("DejaVu Sans", 60)
-    aq_status_font = pygame.font.SysFont("DejaVu Sans", 54)
-
-    temp_title_font = pygame.font.SysFont("DejaVu Sans", 34)
-    temp_value_font = pygame.font.SysFont("DejaVu Sans", 64)
+def temperature_text(temp_c):
+    # the "Outside:" / "Inside:" labels are in the static layer; values start where they end
+    if temp_c is None:
+        return " --.-C", WHITE
+    return f" {temp_c:.1f}C", temp_to_colour(temp_c)
+
+# Bound values are turned into (text, colour) by these; layout.json names them per widget.
+FORMATS = {
+    "text": lambda v: ("" if v is None else str(v), WHITE),
+    "hint": lambda v: ("" if v is None else str(v), SUBTLE),
+    "aq_value": aq_value_text,
+    "aq_status": aq_status_text,
+    "temperature": temperature_text,
+    "pressure": lambda p: ("----hPa" if p is None else f"{p:.0f}hPa", WHITE),
+    "humidity": lambda h: ("--%" if h is None else f"{h:.0f}%", WHITE),
+    "axis": lambda v: (f"{v:.0f}", SUBTLE),
+    "chart_latest": lambda v: (
+        "--" if v[0] is None else f"{v[0]:.0f}{v[1]}" if abs(v[0]) >= 100 else f"{v[0]:.1f}{v[1]}", SUBTLE),
+}
+
+CLOCK_FORMAT = "%d/%m/%Y - %H:%M:%S"
+
+def live_values(pipe, now):
+    """Everything the live page can bind to, read once per frame (cheap: attributes and O(1) windows)."""
+    pm25_band = pm10_band = None
+    if AQ_BAND_WINDOW is not None:
+        pipe.pm_averages.expire(now)
+        pm25_band = pipe.pm_averages.mean("pm25", AQ_BAND_WINDOW)
+        pm10_band = pipe.pm_averages.mean("pm10", AQ_BAND_WINDOW)
+    return {
+        "pm25": ("pm25", pipe.pm25, pm25_band),
+        "pm10": ("pm10", pipe.pm10, pm10_band),
+        "outside_temp": pipe.outside_temp,
+        "inside_temp": pipe.inside_temp,
+        "pressure": pipe.pressure_mb,
+        "pressure_trend": pressure_trend_text(pipe.pressure_history)[0],
+        "pressure_tendency": pipe.tendency.text(),
+        "humidity": pipe.humidity,
+        "comfort": comfort_text(pipe.inside_temp, pipe.humidity),
+        "clock": time.strftime(CLOCK_FORMAT, time.localtime(now)),
+    }
+
+# ---- History page: tap the screen to toggle ----
+HISTORY_TIER = "15m"           # charts are fed from rollups, one column per bucket
+HISTORY_SECONDS = 24 * 3600
+HISTORY_PAGE_SECONDS = 60      # drop back to the live page after this long
+# channel -> (unit, initial value range); where each chart goes is in layout.json
+HISTORY_CHARTS = {
+    "pm25": (UGM3, (0, 50)),
+    "pm10": (UGM3, (0, 80)),
+    "temp_in": ("C", (10, 30)),
+    "pressure": ("hPa", (990, 1030)),
+}
+CHART_COLOURS = {
+    "pm25": lambda v: quality_colour(v, "pm25"),
+    "pm10": lambda v: quality_colour(v, "pm10"),
+    "temp_in": temp_to_colour,
+}
+CHART_SIZE = (384, 150)  # if the layout doesn't give one
+
+def make_charts(bucket_seconds, sizes):
+    """A Sparkline for every HISTORY_CHARTS channel the layout shows, built to its size."""
+    from charts import Sparkline
+    charts = {}
+    for channel, (_, vrange) in HISTORY_CHARTS.items():
+        name = f"{channel}.chart"
+        if name not in sizes:
+            continue
+        w, h = sizes[name] or CHART_SIZE
+        charts[channel] = Sparkline(w, h, bucket_seconds, HISTORY_SECONDS, value_range=vrange,
+                                    colour_fn=CHART_COLOURS.get(channel), background=BLACK, colour=SUBTLE)
+    return charts
+
+def feed_charts(charts, store, since):
+    """Push rollup buckets newer than `since` into the charts. Returns the newest bucket seen."""
+    last = store.last_timestamp(HISTORY_TIER)
+    if last is None or last < since:
+        return since
+    t0 = max(since, last - HISTORY_SECONDS)
+    for channel, chart in charts.items():
+        times, values = store.query(channel, t0, last + 1, tier=HISTORY_TIER)
+        for t, v in zip(times, values):
+            chart.push(t, v)
+    return last + 1
+
+def history_values(charts, now):
+    """Bindings for the history page: each chart's surface (by version), latest value and axis range."""
+    values = {"clock": time.strftime(CLOCK_FORMAT, time.localtime(now))}
+    for channel, chart in charts.items():
+        latest = chart.values[-1][1] if chart.values else None
+        values[f"{channel}.chart"] = (chart.version, chart.surface)
+        values[f"{channel}.latest"] = (latest, HISTORY_CHARTS[channel][0])
+        values[f"{channel}.hi"] = chart.hi
+        values[f"{channel}.lo"] = chart.lo
+    return values
+
+
+# Where everything goes on screen; compiled once at startup (see layout.py)
+LAYOUT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layout.json")
+
+def load_pages(size, path=LAYOUT_FILE):
+    """Compile every page in the layout file for this screen size. Needs pygame.init() first."""
+    from layout import load_layout, compile_page
+    from render_cache import FontCache
+    spec = load_layout(path)
+    cache = FontCache()  # resolved paths persist across runs, skips the system font scan
+    pages = {name: compile_page(spec, name, size, cache.font, FORMATS, background=BLACK)
+             for name in spec["pages"]}
+    cache.save()
+    return pages
+
+
+def register_display_metrics(comp, sched):
+    """Render-side counters, read only when metrics are scraped."""
+    REGISTRY.func("aq_text_cache_hits_total", lambda: comp.text_cache.hits, kind="counter")
+    REGISTRY.func("aq_text_cache_misses_total", lambda: comp.text_cache.misses, kind="counter")
+    REGISTRY.func("aq_loop_wakeups_total", lambda: sched.wakeups, kind="counter")
+
+
+def start_metrics():
+    if METRICS_TEXTFILE:
+        REGISTRY.start_textfile_writer(METRICS_TEXTFILE)
+    if METRICS_HTTP:
+        try:
+            REGISTRY.serve(*METRICS_HTTP)
+        except OSError:
+            pass  # port in use; metrics are optional
+
+
+def make_pipeline(on_update=None, weather_feedparser=True):
+    return Pipeline(
+        STORE_DIR, SDS011_DEVICES, BME280_DEVICES, bme_options=BME_ACQUISITION, bbc_location_id=BBC_LOCATION_ID,
+        weather_feedparser=weather_feedparser, simulate=SIMULATE, on_update=on_update,
+        api_http=API_HTTP, uplink_url=UPLINK_URL, uplink_batch_seconds=UPLINK_BATCH_SECONDS,
+        device_id=DEVICE_ID, stale_seconds=STALE_SECONDS, store_flush_seconds=STORE_FLUSH_SECONDS,
+        spike_filter=SPIKE_FILTER,
+    )
 
-    env_label_font = pygame.font.SysFont("DejaVu Sans", 34)
-    env_value_font = pygame.font.SysFont("DejaVu Sans", 60)
 
-    time_font = pygame.font.SysFont("DejaVu Sans", 64)
+def run_headless():
+    """Log to the store (and API/uplink if enabled) with no display: one pass per second."""
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
 
-    pressure_hint_font = pygame.font.SysFont("DejaVu Sans", 22)
+    pipe = make_pipeline(weather_feedparser=False)
+    start_metrics()
+    try:
+        while not stop.is_set():
+            pipe.update()
+            pipe.persist()
+            stop.wait(1.0 - time.time() % 1.0 + 0.01)  # just past the next second boundary
+    finally:
+        REGISTRY.stop()
+        pipe.close()
 
-    sds = SDS011(SDS_PORT)
-    pm25 = None
-    pm10 = None
-    last_sds_read = 0.0
 
-    bbc = BBCOutsideTemp(BBC_LOCATION_ID, refresh_seconds=60)
-    outside_temp = None
+def main():
+    # display-only imports live here so the headless path never loads SDL
+    import pygame
+    from render_cache import Compositor
+    from scheduler import RedrawScheduler
+    from backlight import BacklightWatch
 
-    bme = BME280Sensor(retry_seconds=10)
-    inside_temp = None
-    humidity = None
-    pressure_mb = None
-    last_env_read = 0.0
+    pygame.init()
+    pygame.mouse.set_visible(False)
 
-    pressure_history = []  # list of (timestamp, pressure_mb)
-    last_pressure_store = 0.0
+    screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.FULLSCREEN)
+    sched = RedrawScheduler(coalesce_ms=COALESCE_MS)
+    # layout.json -> static background + draw list per page, for the size we actually got
+    pages = load_pages(screen.get_size())
+    live = Compositor(screen, background=pages["live"].background)
+    history = Compositor(screen, background=pages["history"].background, text_cache=live.text_cache)
+    comp = live  # the page on screen
+
+    # sensors, store and trend windows; workers wake the loop via sched.notify
+    pipe = make_pipeline(on_update=sched.notify)
+
+    # 24h charts, scrolled one rollup bucket at a time
+    charts = make_charts(pipe.store.bucket_seconds[HISTORY_TIER], pages["history"].sizes)
+    charts_since = feed_charts(charts, pipe.store, 0)
+    history_since = 0.0
+
+    # ---- Metrics: per-stage timings + render counters ----
+    stage = {name: REGISTRY.histogram("aq_loop_stage_seconds", "Main loop stage time",
+                                      labels={"stage": name})
+             for name in ("sleep", "update", "store", "render", "flip")}
+    register_display_metrics(comp, sched)
+    start_metrics()
+    perf = time.perf_counter
+
+    # brightnessd switches the panel off overnight; don't draw to a dark screen
+    backlight = BacklightWatch()
+    screen_on = True
+    REGISTRY.func("aq_display_suspended", lambda: 0 if screen_on else 1,
+                  help="1 while rendering is paused because the backlight is off")
 
     running = True
     while running:
-        for event in pygame.event.get():
+        # Sleep until a worker publishes, the clock ticks over, or input arrives.
+        t0 = perf()
+        events = sched.wait()
+        t1 = perf()
+        stage["sleep"].observe(t1 - t0)
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
                 running = False
-
+            elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                comp.invalidate()
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                comp = history if comp is live else live
+                comp.invalidate()
+                history_since = time.time()
+
+        if comp is history and time.time() - history_since > HISTORY_PAGE_SECONDS:
+            comp = live
+            comp.invalidate()
+
+        pipe.update()
+        t2 = perf()
+        stage["update"].observe(t2 - t1)
+
+        # ---- Persist one sample per second ----
+        if pipe.persist():
+            charts_since = feed_charts(charts, pipe.store, charts_since)
+        t3 = perf()
+        stage["store"].observe(t3 - t2)
+
+        # ---- Backlight off: keep acquiring and logging, skip drawing ----
+        if not backlight.is_on():
+            screen_on = False
+            continue
+        if not screen_on:
+            screen_on = True
+            comp.invalidate()  # panel just woke: full redraw this pass
+
+        # only bound values that changed since the last frame are formatted and placed
         now = time.time()
-
-        # SDS011 ~1Hz
-        if now - last_sds_read >= 1.0:
-            reading = sds.read()
-            if reading:
-                pm25, pm10 = reading
-            last_sds_read = now
-
-        # BBC cached in module
-        outside_temp = bbc.get_temp_c()
-
-        # BME280 ~1Hz (plenty). Keep last good values.
-        if now - last_env_read >= 1.0:
-            t, h, p = bme.read()
-            if t is not None:
-                inside_temp = t
-            if h is not None:
-                humidity = h
-            if p is not None:
-                pressure_mb = p
-            last_env_read = now
-
-            # store pressure history for trend (keep it lightweight)
-            if pressure_mb is not None and (now - last_pressure_store) >= PRESSURE_SAMPLE_MIN_GAP:
-                pressure_history.append((now, pressure_mb))
-                last_pressure_store = now
-
-                # drop old samples
-                cutoff = now - PRESSURE_HISTORY_SECONDS
-                while pressure_history and pressure_history[0][0] < cutoff:
-                    pressure_history.pop(0)
-
-        screen.fill(BLACK)
-
-        # ---- Left column: Air Quality blocks ----
-        render_aq_block(
-            screen, aq_label_font, aq_value_font, aq_status_font,
-            x=40, y=20,
-            label="Air Quality: PM2.5",
-            value=pm25,
-            kind="pm25"
-        )
-
-        render_aq_block(
-            screen, aq_label_font, aq_value_font, aq_status_font,
-            x=40, y=210,
-            label="Air Quality: PM10",
-            value=pm10,
-            kind="pm10"
-        )
-
-        # ---- Top-right: Temperature title ----
-        title = temp_title_font.render("Temperature", True, WHITE)
-        title_rect = title.get_rect(topright=(WIDTH - 120, 20))
-        screen.blit(title, title_rect)
-
-        # Outside: label white, value coloured
-        if outside_temp is None:
-            out_val_text = "--.-C"
-            out_colour = WHITE
+        if comp is history:
+            pages["history"].draw(comp, history_values(charts, now))
         else:
-            out_val_text = f"{outside_temp:.1f}C"
-            out_colour = temp_to_colour(outside_temp)
-
-        outside_label = temp_value_font.render("Outside:", True, WHITE)
-        outside_label_rect = outside_label.get_rect(topright=(WIDTH - 200, 60))
-        screen.blit(outside_label, outside_label_rect)
+            pages["live"].draw(comp, live_values(pipe, now))
 
-        out_val = temp_value_font.render(f" {out_val_text}", True, out_colour)
-        out_val_rect = out_val.get_rect(topleft=(outside_label_rect.right, outside_label_rect.top))
-        screen.blit(out_val, out_val_rect)
+        t4 = perf()
+        stage["render"].observe(t4 - t3)
 
-        # Inside: label white, value coloured (always rendered)
-        if inside_temp is None:
-            in_val_text = "--.-C"
-            in_colour = WHITE
-        else:
-            in_val_text = f"{inside_temp:.1f}C"
-            in_colour = temp_to_colour(inside_temp)
-
-        inside_label = temp_value_font.render("Inside:", True, WHITE)
-        inside_label_rect = inside_label.get_rect(topright=(WIDTH - 200, 140))
-        screen.blit(inside_label, inside_label_rect)
-
-        in_val = temp_value_font.render(f" {in_val_text}", True, in_colour)
-        in_val_rect = in_val.get_rect(topleft=(inside_label_rect.right, inside_label_rect.top))
-        screen.blit(in_val, in_val_rect)
-
-        # ---- Bottom-right: Pressure (left) and Humidity (right) ----
-        # Layout based on your photo: there's space to shift humidity right and slot pressure left.
-        bottom_block_top = 235
-
-        # Pressure (left of humidity)
-        pres_label = env_label_font.render("Pressure", True, WHITE)
-        pres_label_rect = pres_label.get_rect(topright=(WIDTH - 230, bottom_block_top))
-        screen.blit(pres_label, pres_label_rect)
-
-        if pressure_mb is None:
-            pres_text = "----hPa"
-        else:
-            pres_text = f"{pressure_mb:.0f}hPa"
+        # only the widgets that changed are re-blitted and pushed to the panel
+        comp.flush()
+        stage["flip"].observe(perf() - t4)
 
-        pres_val = env_value_font.render(pres_text, True, WHITE)
-        pres_val_rect = pres_val.get_rect(topright=(WIDTH - 230, bottom_block_top + 35))
-        screen.blit(pres_val, pres_val_rect)
-
-        # Then show comment about trend...
-        trend_text, trend_colour = pressure_trend_text(pressure_history)
-        trend_surf = pressure_hint_font.render(trend_text, True, trend_colour)
-        trend_rect = trend_surf.get_rect(topright=(WIDTH - 230, bottom_block_top + 100))
-        screen.blit(trend_surf, trend_rect)
-
-        # Humidity (shifted right)
-        hum_label = env_label_font.render("Humidity", True, WHITE)
-        hum_label_rect = hum_label.get_rect(topright=(WIDTH - 10, bottom_block_top))
-        screen.blit(hum_label, hum_label_rect)
-
-        if humidity is None:
-            hum_text = "--%"
-        else:
-            hum_text = f"{humidity:.0f}%"
-
-        hum_val = env_value_font.render(hum_text, True, WHITE)
-        hum_val_rect = hum_val.get_rect(topright=(WIDTH - 10, bottom_block_top + 35))
-        screen.blit(hum_val, hum_val_rect)
-
-        comfort = comfort_text(inside_temp, humidity)
-        comfort_surf = pressure_hint_font.render(comfort, True, SUBTLE)
-        comfort_rect = comfort_surf.get_rect(topright=(WIDTH - 10, bottom_block_top + 100))
-        screen.blit(comfort_surf, comfort_rect)
-
-
-        # ---- Time (bottom centre) ----
-        timestamp = time.strftime("%d/%m/%Y - %H:%M:%S")
-        t_surf = time_font.render(timestamp, True, WHITE)
-        t_rect = t_surf.get_rect(midbottom=(WIDTH // 2, HEIGHT - 16))
-        screen.blit(t_surf, t_rect)
-
-        pygame.display.flip()
-        clock.tick(FPS)
-
-    sds.close()
+    REGISTRY.stop()
+    backlight.close()
+    pipe.close()
     pygame.quit()
 
+
 if __name__ == "__main__":
-    main()
+    if "--headless" in sys.argv[1:]:
+        run_headless()
+    else:
+        main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Simulated hardware so the stack can run (and be profiled) off the Pi.
+
+  SDS011Emulator  - a pty that streams SDS011 frames; SDS011(emu.port) opens
+                    it like the real USB serial adaptor. Corruption and
+                    misalignment can be injected.
+  FakeSpiDev      - an in-memory spidev.SpiDev stand-in with a BME280
+                    register map (chip id, calibration, ctrl/status, ADC data).
+                    Pass it as spi_factory to BME280SPI / BME280Sensor.
+
+Run directly to stream frames on a pty for manual testing:
+    python3 hwsim.py
+"""
+import math
+import os
+import random
+import threading
+import time
+import tty
+
+from bme280_compensation import (
+    SAMPLE_CALIBRATION,
+    CALIB_TP_REG,
+    CALIB_H_REG,
+    compensate_temperature,
+    compensate_pressure,
+    compensate_humidity,
+)
+
+
+# ---------- SDS011 ----------
+
+def sds011_frame(pm25: float, pm10: float, device_id: int = 0xA1B2) -> bytes:
+    """Encode one AA C0 ... AB data frame."""
+    p25 = max(0, min(9999, int(round(pm25 * 10))))
+    p10 = max(0, min(9999, int(round(pm10 * 10))))
+    d = [p25 & 0xFF, p25 >> 8, p10 & 0xFF, p10 >> 8, device_id & 0xFF, (device_id >> 8) & 0xFF]
+    return bytes([0xAA, 0xC0] + d + [sum(d) & 0xFF, 0xAB])
+
+
+def default_pm(t: float):
+    """Slowly wandering PM values with the odd spike."""
+    base = 8.0 + 6.0 * math.sin(t / 600.0)
+    pm25 = max(0.0, base + random.gauss(0, 0.8))
+    if random.random() < 0.01:
+        pm25 += random.uniform(50, 300)
+    return pm25, pm25 * 1.6 + random.gauss(0, 1.0)
+
+
+class SDS011Emulator:
+    """
+    Streams frames at `rate` Hz into a pseudo-terminal. Open `port` with
+    pyserial (or SDS011) exactly like the real device.
+
+    corrupt_rate:  chance a frame's checksum is broken
+    drop_rate:     chance one byte of a frame is dropped (misaligns the stream)
+    junk_rate:     chance a few random bytes are inserted before a frame
+    """
+
+    def __init__(self, rate: float = 1.0, device_id: int = 0xA1B2, pm_fn=default_pm,
+                 corrupt_rate: float = 0.0, drop_rate: float = 0.0, junk_rate: float = 0.0):
+        self.rate = rate
+        self.device_id = device_id
+        self.pm_fn = pm_fn
+        self.corrupt_rate = corrupt_rate
+        self.drop_rate = drop_rate
+        self.junk_rate = junk_rate
+        self.frames_sent = 0
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)  # no echo / CR-LF translation before pyserial opens it
+        self.port = os.ttyname(self._slave)
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _next_bytes(self) -> bytes:
+        pm25, pm10 = self.pm_fn(time.time())
+        frame = bytearray(sds011_frame(pm25, pm10, self.device_id))
+        if random.random() < self.corrupt_rate:
+            frame[8] ^= 0x5A
+        if random.random() < self.drop_rate:
+            del frame[random.randrange(len(frame))]
+        if random.random() < self.junk_rate:
+            frame[0:0] = bytes(random.randrange(256) for _ in range(random.randint(1, 6)))
+        return bytes(frame)
+
+    def _run(self) -> None:
+        period = 1.0 / self.rate
+        next_t = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                os.write(self._master, self._next_bytes())
+            except OSError:
+                break
+            self.frames_sent += 1
+            next_t += period
+            self._stop.wait(max(0.0, next_t - time.monotonic()))
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._run, name="sds011-sim", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+# ---------- BME280 ----------
+
+def default_env(t: float):
+    """(temp_c, humidity_pct, pressure_mb) drifting over a simulated day."""
+    day = t / 86400.0 * 2 * math.pi
+    return (
+        20.0 + 2.5 * math.sin(day) + random.gauss(0, 0.02),
+        45.0 + 8.0 * math.sin(day + 1.0) + random.gauss(0, 0.1),
+        1013.0 + 4.0 * math.sin(t / 21600.0) + random.gauss(0, 0.03),
+    )
+
+
+def _solve(fn, target: float, lo: int, hi: int) -> int:
+    """Smallest integer x in [lo, hi] with fn(x) >= target, for monotonic increasing fn."""
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if fn(mid) < target:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def encode_adc(calib, temp_c: float, humidity_pct: float, pressure_mb: float):
+    """Inverse compensation: raw (adc_T, adc_P, adc_H) that read back as these values."""
+    adc_T = _solve(lambda a: compensate_temperature(calib, a)[0], temp_c, 0, (1 << 20) - 1)
+    t_fine = compensate_temperature(calib, adc_T)[1]
+    # pressure falls as adc_P rises, so search on the negated value
+    adc_P = _solve(lambda a: -compensate_pressure(calib, a, t_fine), -pressure_mb, 0, (1 << 20) - 1)
+    adc_H = _solve(lambda a: compensate_humidity(calib, a, t_fine), humidity_pct, 0, 0xFFFF)
+    return adc_T, adc_P, adc_H
+
+
+class FakeSpiDev:
+    """
+    spidev.SpiDev stand-in backed by a BME280 register map. Honours
+    ctrl_meas modes: a forced write starts a conversion that sets the status
+    measuring bit for the datasheet time; normal mode refreshes the data
+    registers every measurement + standby period.
+    """
+
+    MEASURE_S = 0.0093  # x1/x1/x1 max measurement time
+
+    def __init__(self, calib=SAMPLE_CALIBRATION, env_fn=default_env, chip_id: int = 0x60):
+        self.calib = calib
+        self.env_fn = env_fn
+        self.max_speed_hz = 0
+        self.mode = 0
+        self.transfers = 0
+
+        self.regs = bytearray(256)
+        self.regs[0xD0] = chip_id
+        tp, h = calib.to_registers()
+        self.regs[CALIB_TP_REG:CALIB_TP_REG + len(tp)] = tp
+        self.regs[CALIB_H_REG:CALIB_H_REG + len(h)] = h
+
+        self._measure_until = 0.0
+        self._next_normal = 0.0
+        self._convert()
+
+    def open(self, bus: int, device: int) -> None:
+        self.bus, self.device = bus, device
+
+    def close(self) -> None:
+        pass
+
+    def _convert(self) -> None:
+        adc_T, adc_P, adc_H = encode_adc(self.calib, *self.env_fn(time.time()))
+        self.regs[0xF7] = adc_P >> 12
+        self.regs[0xF8] = (adc_P >> 4) & 0xFF
+        self.regs[0xF9] = (adc_P & 0x0F) << 4
+        self.regs[0xFA] = adc_T >> 12
+        self.regs[0xFB] = (adc_T >> 4) & 0xFF
+        self.regs[0xFC] = (adc_T & 0x0F) << 4
+        self.regs[0xFD] = adc_H >> 8
+        self.regs[0xFE] = adc_H & 0xFF
+
+    def _tick(self) -> None:
+        now = time.monotonic()
+        mode = self.regs[0xF4] & 0x03
+        if self._measure_until and now >= self._measure_until:
+            self._measure_until = 0.0
+            self._convert()
+            if mode == 0b01:
+                self.regs[0xF4] &= 0xFC  # forced -> back to sleep
+        if mode == 0b11 and now >= self._next_normal:
+            self._convert()
+            standby = (0.5, 62.5, 125, 250, 500, 1000, 10, 20)[self.regs[0xF5] >> 5] / 1000.0
+            period = self.MEASURE_S + standby
+            if not self._next_normal:
+                self._next_normal = now
+            # free running like the chip, not in step with whoever is polling
+            self._next_normal += period * (int((now - self._next_normal) / period) + 1)
+        self.regs[0xF3] = 0x08 if self._measure_until else 0x00
+
+    def xfer2(self, tx):
+        self.transfers += 1
+        self._tick()
+        # SPI drops bit 7 of the address; every BME280 register lives at 0x80+
+        reg = tx[0] | 0x80
+        if tx[0] & 0x80:
+            return [0] + list(self.regs[reg:reg + len(tx) - 1])
+
+        # writes: (addr, value) pairs
+        for i in range(0, len(tx) - 1, 2):
+            reg, val = tx[i] | 0x80, tx[i + 1]
+            if reg == 0xE0 and val == 0xB6:
+                continue  # soft reset: nothing to do for the sim
+            self.regs[reg] = val
+            if reg == 0xF4 and (val & 0x03) == 0b01:
+                self._measure_until = time.monotonic() + self.MEASURE_S
+        self._tick()
+        return [0] * len(tx)
+
+
+if __name__ == "__main__":
+    emu = SDS011Emulator(rate=1.0, corrupt_rate=0.05, drop_rate=0.05, junk_rate=0.05)
+    print(f"SDS011 emulator streaming on {emu.start()} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        emu.stop()
@@ -0,0 +1,173 @@
+"""
+Declarative screen layouts.
+
+A layout file (layout.json) describes each page as a tree of widgets:
+static labels, text bound to a named value, and images (charts), grouped
+and anchored relative to the screen edges. compile_page() turns one page,
+once at startup, into
+
+  - a background surface with every static label already drawn on it
+  - a flat draw list of the bound widgets, each with its font, formatter
+    and anchor point resolved to fixed screen coordinates
+
+so per frame Page.draw() only compares each bound value with the last one
+drawn, and formats/re-places the ones that changed (the Compositor then
+pushes just those rects). A different screen size or arrangement is a
+different layout file, not a code change.
+
+Widget keys:
+    "from"      screen reference point (topleft, midtop, topright, midleft, center,
+                midright, bottomleft, midbottom, bottomright); without it a widget
+                is placed relative to its group's origin
+    "at"        [x, y] offset from that point
+    "anchor"    which point of the widget sits there (default topleft)
+    "children"  makes it a group: children are placed relative to it
+    "label"     static text (with "font", optional "colour")
+    "bind"      name of a value supplied per frame, drawn as text through "format"
+    "image"     name of a value supplied as (version, surface); an optional "size"
+                [w, h] is handed back in Page.sizes so the owner can build it to fit
+    "id"        widget key, when one bound value feeds several widgets with the same format
+"""
+import json
+
+import pygame
+
+SCREEN_POINTS = ("topleft", "midtop", "topright", "midleft", "center", "midright",
+                 "bottomleft", "midbottom", "bottomright")
+COLOURS = {"white": (245, 245, 245), "subtle": (180, 180, 180), "black": (0, 0, 0)}
+
+_UNSET = object()
+
+
+def load_layout(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _colour(c):
+    if c is None:
+        return COLOURS["white"]
+    if isinstance(c, str):
+        return COLOURS[c]
+    return tuple(c)
+
+
+class DrawItem:
+    """One bound widget with everything but its value worked out in advance."""
+
+    __slots__ = ("key", "bind", "font", "format", "anchor", "image", "last")
+
+    def __init__(self, key, bind, font, format, anchor, image=False):
+        self.key = key
+        self.bind = bind
+        self.font = font
+        self.format = format
+        self.anchor = anchor  # {"topright": (x, y)}, passed straight to the Compositor
+        self.image = image
+        self.last = _UNSET
+
+
+class Page:
+    """
+    background: Surface with the static labels (use it as the Compositor background).
+    fonts: role -> Font. sizes: image name -> (w, h) from the layout, or None.
+    """
+
+    def __init__(self, name, background, items, fonts, sizes):
+        self.name = name
+        self.background = background
+        self.items = items
+        self.fonts = fonts
+        self.sizes = sizes
+        self.bindings = {item.bind for item in items}
+
+    def draw(self, comp, values: dict) -> int:
+        """
+        Place every widget whose bound value changed since the last draw.
+        Bindings missing from values are left as they are. Returns how many changed.
+        """
+        changed = 0
+        for item in self.items:
+            v = values.get(item.bind, _UNSET)
+            if v is _UNSET or v == item.last:
+                continue
+            item.last = v
+            changed += 1
+            if item.image:
+                if v is None:
+                    comp.remove(item.key)
+                else:
+                    version, surface = v
+                    comp.put(item.key, version, lambda s=surface: s, **item.anchor)
+            else:
+                text, colour = item.format(v)
+                comp.text(item.key, item.font, text, colour, **item.anchor)
+        return changed
+
+    def reset(self) -> None:
+        """Forget what was drawn (e.g. the page is going onto a fresh Compositor)."""
+        for item in self.items:
+            item.last = _UNSET
+
+
+def _point(rect: pygame.Rect, name: str):
+    if name not in SCREEN_POINTS:
+        raise ValueError(f"unknown anchor point {name!r}")
+    return getattr(rect, name)
+
+
+def compile_page(spec: dict, page: str, size, font_for, formats: dict, background=(0, 0, 0)) -> Page:
+    """
+    spec: the parsed layout file. size: actual screen size, (w, h).
+    font_for(family, point size) -> Font (e.g. FontCache.font).
+    formats: name -> fn(value) -> (text, colour), for "bind" widgets.
+    """
+    if page not in spec.get("pages", {}):
+        raise ValueError(f"layout has no page {page!r}")
+
+    family = spec.get("font")
+    fonts = {role: font_for(family, pt) for role, pt in spec.get("fonts", {}).items()}
+    screen = pygame.Rect((0, 0), size)
+
+    layer = pygame.Surface(size)
+    if pygame.display.get_surface() is not None:
+        layer = layer.convert()  # match the screen format so restore-blits are plain copies
+    layer.fill(background)
+
+    items = []
+    sizes = {}
+
+    def font(role):
+        if role not in fonts:
+            raise ValueError(f"layout font role {role!r} is not in \"fonts\"")
+        return fonts[role]
+
+    def walk(widgets, origin, path):
+        for i, w in enumerate(widgets):
+            x, y = w.get("at", (0, 0))
+            ref = _point(screen, w["from"]) if "from" in w else origin
+            pos = (ref[0] + x, ref[1] + y)
+            anchor = w.get("anchor", "topleft")
+            _point(screen, anchor)  # validate
+            key = (page, w.get("id") or w.get("bind") or w.get("image") or f"{path}{i}")
+
+            if "children" in w:
+                walk(w["children"], pos, f"{path}{i}.")
+            elif "label" in w:
+                surf = font(w["font"]).render(w["label"], True, _colour(w.get("colour")))
+                layer.blit(surf, surf.get_rect(**{anchor: pos}))
+            elif "bind" in w:
+                fmt = w.get("format", "text")
+                if fmt not in formats:
+                    raise ValueError(f"unknown format {fmt!r} for {w['bind']!r}")
+                if "id" not in w:
+                    key = (page, w["bind"], fmt)  # one value can feed several widgets
+                items.append(DrawItem(key, w["bind"], font(w["font"]), formats[fmt], {anchor: pos}))
+            elif "image" in w:
+                sizes[w["image"]] = tuple(w["size"]) if "size" in w else None
+                items.append(DrawItem(key, w["image"], None, None, {anchor: pos}, image=True))
+            else:
+                raise ValueError(f"layout widget {path}{i} has nothing to draw")
+
+    walk(spec["pages"][page], screen.topleft, "")
+    return Page(page, layer, items, fonts, sizes)
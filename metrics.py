@@ -0,0 +1,235 @@
+"""
+Tiny in-process metrics: counters, gauges and fixed-bucket histograms,
+exported in Prometheus text format (textfile or a local /metrics endpoint).
+
+Hot-path cost is a perf_counter() pair and a bisect into a short tuple.
+Updates are lock-free; each metric is normally fed from one thread, and an
+occasional lost increment under contention is acceptable for diagnostics.
+
+    from metrics import REGISTRY
+    RENDER = REGISTRY.histogram("aq_render_seconds", "Widget render time")
+    t0 = perf_counter(); ...; RENDER.observe(perf_counter() - t0)
+"""
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# seconds: 100µs .. 10s, covers both frame stages and HTTP fetches
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt(v) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Counter:
+    __slots__ = ("name", "help", "labels", "value")
+    kind = "counter"
+
+    def __init__(self, name, help="", labels=None):
+        self.name, self.help, self.labels = name, help, labels or {}
+        self.value = 0
+
+    def inc(self, n=1) -> None:
+        self.value += n
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Gauge(Counter):
+    __slots__ = ()
+    kind = "gauge"
+
+    def set(self, v) -> None:
+        self.value = v
+
+
+class FuncMetric:
+    """Counter or gauge whose value is read from fn() at export time (e.g. driver stats)."""
+    __slots__ = ("name", "help", "labels", "fn", "kind")
+
+    def __init__(self, name, fn, kind="gauge", help="", labels=None):
+        self.name, self.fn, self.kind, self.help, self.labels = name, fn, kind, help, labels or {}
+
+    def samples(self):
+        try:
+            v = self.fn()
+        except Exception:
+            return
+        if v is not None:
+            yield self.name, self.labels, v
+
+
+class Histogram:
+    __slots__ = ("name", "help", "labels", "bounds", "counts", "sum", "count")
+    kind = "histogram"
+
+    def __init__(self, name, help="", buckets=DEFAULT_BUCKETS, labels=None):
+        self.name, self.help, self.labels = name, help, labels or {}
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # last = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def samples(self):
+        cum = 0
+        for bound, c in zip(self.bounds + (float("inf"),), self.counts):
+            cum += c
+            yield self.name + "_bucket", dict(self.labels, le=_fmt(bound)), cum
+        yield self.name + "_sum", self.labels, self.sum
+        yield self.name + "_count", self.labels, self.count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._by_key = {}
+        self._server = None
+        self._writer = None
+        self._stop = threading.Event()
+
+    def _add(self, metric):
+        """
+        Registering the same name + labels again returns the existing metric,
+        so counts carry across rebuilt owners. A func metric takes the new fn,
+        so it reads the object that registered last, not a closed predecessor.
+        """
+        key = (metric.name, tuple(sorted(metric.labels.items())))
+        existing = self._by_key.get(key)
+        if existing is not None:
+            if isinstance(existing, FuncMetric) and isinstance(metric, FuncMetric):
+                existing.fn = metric.fn
+            return existing
+        self._by_key[key] = metric
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help="", labels=None) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help="", labels=None) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS, labels=None) -> Histogram:
+        return self._add(Histogram(name, help, buckets, labels))
+
+    def func(self, name, fn, kind="gauge", help="", labels=None) -> FuncMetric:
+        return self._add(FuncMetric(name, fn, kind, help, labels))
+
+    def render(self) -> str:
+        # the exposition format wants each family's samples together, under one HELP/TYPE,
+        # however interleaved the registrations were
+        families = {}
+        for m in list(self._metrics):
+            families.setdefault(m.name, []).append(m)
+
+        lines = []
+        for name, members in families.items():
+            first = members[0]
+            help = next((m.help for m in members if m.help), "")
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {first.kind}")
+            for m in members:
+                for sample, labels, value in m.samples():
+                    lines.append(f"{sample}{_labels(labels)} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
+
+    # --- export ---
+    def write_textfile(self, path: str) -> None:
+        """Atomic write for node_exporter's textfile collector."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def start_textfile_writer(self, path: str, interval: float = 15.0) -> None:
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.write_textfile(path)
+                except OSError:
+                    pass
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._writer = threading.Thread(target=run, name="metrics-textfile", daemon=True)
+        self._writer.start()
+
+    def serve(self, host: str = "127.0.0.1", port: int = 9108):
+        """GET /metrics on a daemon thread. Returns the server."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+REGISTRY = Registry()
+
+
+def self_test() -> None:
+    """Re-registration hands over func metrics and keeps families together."""
+    reg = Registry()
+
+    class Owner:
+        def __init__(self, v):
+            self.v = v
+
+    old, new = Owner(1), Owner(2)
+    reg.func("t_value", lambda: old.v, help="value of the current owner")
+    reg.counter("t_events_total", "events").inc()
+    m = reg.func("t_value", lambda: new.v)
+    assert reg.counter("t_events_total").value == 1, "re-registered counter lost its count"
+    assert m.fn() == 2, "re-registered func metric kept the old fn"
+    text = reg.render()
+    assert "t_value 2\n" in text and "t_value 1\n" not in text, f"stale value exported:\n{text}"
+    assert text.count("# TYPE t_value ") == 1, f"family emitted twice:\n{text}"
+    print("ok")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["--self-test"]:
+        self_test()
+    else:
+        sys.exit("usage: python3 metrics.py --self-test")
@@ -0,0 +1,320 @@
+"""
+Acquisition -> analytics -> storage, without any display.
+
+Shared by the dashboard (display_app.main) and the headless logger
+(display_app.py --headless). Nothing in here imports pygame or feedparser,
+and the optional pieces (BBC weather, LAN API, uplink, simulator) are only
+imported when they're switched on, so a screenless Pi logging PM and BME280
+data starts quickly and stays small.
+
+The owner calls update() whenever it wakes (cheap: reads worker snapshots)
+and persist() at least once a second, then close() on the way out.
+"""
+import os
+import time
+
+from analytics import (RollingRegression, PressureTendency, PMAverages, SpikeFilter, PM_WINDOWS,
+                       TENDENCY_SECONDS)
+from bme280_compensation import RawAdcLog
+from devices import SensorHub
+from metrics import REGISTRY
+from timeseries import TimeSeriesStore
+
+PRESSURE_HISTORY_SECONDS = 30 * 60   # 30 minutes
+PRESSURE_SAMPLE_MIN_GAP = 20         # don't store more often than every 20s
+PRESSURE_TENDENCY_GAP = 300          # 3h tendency window keeps one sample per 5 min
+
+# channels kept for each additional (non-primary) device, in its own store
+DEVICE_CHANNELS = {
+    "sds011": ("pm25", "pm10"),
+    "bme280": ("temp", "humidity", "pressure"),
+}
+
+
+def seed_pressure_windows(store, history, tendency):
+    """Prime the pressure windows from stored 1-minute means so trends survive a restart."""
+    now = time.time()
+    times, values = store.query("pressure", now - TENDENCY_SECONDS, now, tier="1m")
+    for t, p in zip(times, values):
+        if p == p:  # skip NaN (missing)
+            history.add(t, p)
+            tendency.add(t, p)
+
+
+def seed_pm_averages(store, averages):
+    """
+    Prime the PM windows from stored 1-minute means (covers the 24h window).
+    Each mean counts as the readings it was taken over (rows where that
+    channel had a value), so a seeded minute weighs the same as a live one.
+    """
+    now = time.time()
+    for kind in ("pm25", "pm10"):
+        times, values = store.query(kind, now - 86400, now, tier="1m")
+        _, counts = store.counts(kind, now - 86400, now, tier="1m")
+        for t, v, n in zip(times, values, counts):
+            if v == v and n:
+                averages.add(t, kind, v, n)
+
+
+class Pipeline:
+    """
+    Owns the sensors, the acquisition hub, the stores and the rolling analytics.
+
+    sds_devices: name -> serial port, bme_devices: name -> (spi bus, chip select).
+    The first device of each kind is the primary one: it feeds the dashboard,
+    the main store and the trend windows, and its latest values are plain
+    attributes (pm25, pm10, inside_temp, humidity, pressure_mb, outside_temp;
+    None until it has reported). Every other device is logged to its own
+    store under <store_dir>/devices/<kind>.<name> and shows up in extra_readings().
+
+    on_update is passed to the hub and the weather fetcher (the display uses it to wake its loop).
+    weather_feedparser=False parses the BBC feed with the plain regex
+    fallback, so feedparser is never imported.
+    simulate=True swaps in hwsim's devices and stores under <store_dir>-sim instead.
+    spike_filter: channel -> SpikeFilter options ({"pm25": {...}, "pm10": {...}}),
+    applied to every SDS011 before anything is displayed or stored; None to pass frames through.
+    """
+
+    def __init__(self, store_dir: str, sds_devices: dict, bme_devices: dict, bme_options=None,
+                 bbc_location_id=None, weather_feedparser: bool = True, simulate: bool = False,
+                 on_update=None, api_http=None, uplink_url=None, uplink_batch_seconds: float = 60,
+                 device_id: str = "", stale_seconds: float = 10, store_flush_seconds: float = 60,
+                 spike_filter=None):
+        self.stale_seconds = stale_seconds
+        self.store_flush_seconds = store_flush_seconds
+
+        self.pm25 = None
+        self.pm10 = None
+        self.outside_temp = None
+        self.inside_temp = None
+        self.humidity = None
+        self.pressure_mb = None
+        self.readings = {}  # last row written to the store
+
+        # One hub thread services every serial port and SPI device; update()
+        # only reads snapshots, so a slow device can't stall the owner.
+        self.sims = []
+        sds_devices = dict(sds_devices)
+        bme_options = dict(bme_options or {})
+        if simulate:
+            import hwsim
+            # keep fake history (and the sample calibration) out of the real store
+            store_dir = os.path.normpath(store_dir) + "-sim"
+            for i, name in enumerate(sds_devices):
+                sim = hwsim.SDS011Emulator(rate=1.0, device_id=0xA1B2 + i, corrupt_rate=0.02, drop_rate=0.02)
+                sds_devices[name] = sim.start()
+                self.sims.append(sim)
+            bme_options.update(spi_factory=hwsim.FakeSpiDev, calib_cache=None)
+
+        # hub source names are "<kind>.<name>", so "indoor" can be both an SDS011 and a BME280
+        self.hub = SensorHub(on_update=on_update)
+        self.sds_primary = self.bme_primary = None
+        self.spike_filters = {}
+        for name, port in sds_devices.items():
+            key = f"sds011.{name}"
+            self.sds_primary = self.sds_primary or key
+            if spike_filter:
+                self.spike_filters[key] = tuple(SpikeFilter(**spike_filter.get(c, {}))
+                                                for c in DEVICE_CHANNELS["sds011"])
+            self.hub.add_sds011(key, port, filters=self.spike_filters.get(key))
+
+        # raw ADC triples + calibration are logged so history can be recomputed in batch
+        self.raw_logs = {}
+        for name, (bus, device) in bme_devices.items():
+            key = f"bme280.{name}"
+            self.bme_primary = self.bme_primary or key
+            raw_dir = store_dir if key == self.bme_primary else os.path.join(store_dir, "devices", key)
+            self.raw_logs[key] = RawAdcLog(os.path.join(raw_dir, "bme280_raw.u32"))
+            self.hub.add_bme280(key, bus, device, raw_log=self.raw_logs[key], **bme_options)
+
+        self.hub.start()
+        self._register_metrics()
+
+        # BBC refreshes itself in the background and serves the cached value
+        self.bbc = None
+        if bbc_location_id:
+            from bbc_weather import BBCOutsideTemp
+            self.bbc = BBCOutsideTemp(bbc_location_id, refresh_seconds=60, on_update=on_update,
+                                      use_feedparser=weather_feedparser)
+            self.bbc.start()
+
+        self.store = TimeSeriesStore(store_dir)
+        REGISTRY.func("aq_store_dropped_rows_total", lambda: self.store.dropped, kind="counter",
+                      help="Rows not stored because the clock went backwards")
+        self.device_stores = {
+            name: TimeSeriesStore(os.path.join(store_dir, "devices", name), DEVICE_CHANNELS[kind])
+            for name, kind in self.hub.kinds.items()
+            if name not in (self.sds_primary, self.bme_primary)
+        }
+
+        # Fixed-size windows: short trend and the 3h tendency, seeded from the store
+        self.pressure_history = RollingRegression(PRESSURE_HISTORY_SECONDS, min_gap=PRESSURE_SAMPLE_MIN_GAP)
+        self.tendency = PressureTendency(sample_gap=PRESSURE_TENDENCY_GAP)
+        seed_pressure_windows(self.store, self.pressure_history, self.tendency)
+
+        self.pm_averages = PMAverages()
+        seed_pm_averages(self.store, self.pm_averages)
+
+        self._last_sds_seq = 0
+        self._last_env_seq = 0
+        self._last_store_second = 0
+        self._last_store_flush = time.time()
+
+        # read-only API for other machines: serves what persist() publishes
+        self.api = None
+        if api_http:
+            from api_server import ApiServer
+            try:
+                self.api = ApiServer(self.store, *api_http)
+                self.api.start()
+            except OSError:
+                self.api = None  # port in use; logging doesn't need it
+
+        # batched, spooled push to the collector; enqueue() never touches disk or network
+        self.uplink = None
+        if uplink_url:
+            from uplink import Uplink
+            self.uplink = Uplink(uplink_url, os.path.join(store_dir, "spool"), device_id,
+                                 batch_seconds=uplink_batch_seconds)
+            self.uplink.start()
+
+    def _register_metrics(self):
+        """Expose driver counters that are kept elsewhere, read only when metrics are scraped."""
+        hub = self.hub
+        for name in hub.sds:
+            labels = {"device": name}
+            for key in ("frames_ok", "bad_frames", "skipped_bytes", "dropped_frames"):
+                # the SDS011 object is replaced on reconnect, so look it up each scrape
+                REGISTRY.func(f"aq_sds011_{key}_total", lambda n=name, k=key: getattr(hub.sds[n].parser, k),
+                              kind="counter", help="SDS011 frame parser counter", labels=labels)
+        for name, filters in self.spike_filters.items():
+            for channel, f in zip(DEVICE_CHANNELS["sds011"], filters):
+                REGISTRY.func("aq_sds011_spikes_total", lambda f=f: f.spikes, kind="counter",
+                              help="SDS011 samples replaced by the rolling median",
+                              labels={"device": name, "channel": channel})
+        for name, bme in hub.bme.items():
+            labels = {"device": name}
+            REGISTRY.func("aq_bme280_reinits_total", lambda b=bme: max(0, b.init_count - 1), kind="counter",
+                          help="BME280 re-initialisations after a bus error", labels=labels)
+            REGISTRY.func("aq_bme280_init_seconds", lambda b=bme: b.last_init_seconds,
+                          help="Duration of the last BME280 bring-up", labels=labels)
+
+    def update(self) -> None:
+        """Pull the latest snapshots (each is replaced atomically by its worker)."""
+        snap = self.hub.snapshot(self.sds_primary)
+        if snap is not None:
+            self.pm25, self.pm10 = snap.value
+            if snap.seq != self._last_sds_seq:
+                self._last_sds_seq = snap.seq
+                self.pm_averages.add(snap.timestamp, "pm25", self.pm25)
+                self.pm_averages.add(snap.timestamp, "pm10", self.pm10)
+
+        if self.bbc is not None:
+            self.outside_temp = self.bbc.get_temp_c()
+
+        snap = self.hub.snapshot(self.bme_primary)
+        if snap is not None and snap.seq != self._last_env_seq:
+            self._last_env_seq = snap.seq
+            t, h, p = snap.value
+            # Keep last good values.
+            if t is not None:
+                self.inside_temp = t
+            if h is not None:
+                self.humidity = h
+            if p is not None:
+                self.pressure_mb = p
+
+            # feed the trend windows (each ignores samples closer than its min gap)
+            if p is not None:
+                self.pressure_history.add(snap.timestamp, p)
+                self.tendency.add(snap.timestamp, p)
+
+    def persist(self, now: float = None) -> bool:
+        """Store one sample per wall-clock second. Returns True if a row was written."""
+        if now is None:
+            now = time.time()
+        if int(now) == self._last_store_second:
+            return False
+        self._last_store_second = int(now)
+
+        pm_fresh = self._fresh(self.sds_primary, now)
+        env_fresh = self._fresh(self.bme_primary, now)
+        readings = {
+            "pm25": self.pm25 if pm_fresh else None,
+            "pm10": self.pm10 if pm_fresh else None,
+            "temp_in": self.inside_temp if env_fresh else None,
+            "humidity": self.humidity if env_fresh else None,
+            "pressure": self.pressure_mb if env_fresh else None,
+            "temp_out": self.outside_temp,
+        }
+        self.readings = readings
+        self.store.append(now, readings)
+
+        extra = self.extra_readings(now)
+        for name, row in extra.items():
+            self.device_stores[name].append(now, {c: row[c] for c in self.device_stores[name].channels})
+
+        if self.uplink is not None:
+            self.uplink.enqueue(now, dict(readings, devices=extra) if extra else readings)
+        if self.api is not None:
+            self._publish(now, readings, extra)
+
+        if now - self._last_store_flush >= self.store_flush_seconds:
+            self.store.flush()
+            for store in self.device_stores.values():
+                store.flush()
+            for log in self.raw_logs.values():
+                log.flush()
+            self._last_store_flush = now
+        return True
+
+    def _fresh(self, name, now) -> bool:
+        snap = self.hub.snapshot(name) if name is not None else None
+        return snap is not None and now - snap.timestamp < self.stale_seconds
+
+    def extra_readings(self, now: float = None) -> dict:
+        """name -> {"id", channel values...} for every non-primary device (None where stale)."""
+        if now is None:
+            now = time.time()
+        out = {}
+        for name in self.device_stores:
+            snap = self.hub.snapshot(name)
+            fresh = self._fresh(name, now)
+            kind = self.hub.kinds[name]
+            values = snap.value if fresh else (None,) * len(DEVICE_CHANNELS[kind])
+            row = dict(zip(DEVICE_CHANNELS[kind], values))
+            row["id"] = self.hub.device_ids.get(name)
+            out[name] = row
+        return out
+
+    def _publish(self, now, readings, extra):
+        # rounded so tiny drifts in the means don't force a new body every second
+        self.pm_averages.expire(now)
+        averages = {}
+        for kind in ("pm25", "pm10"):
+            for w in PM_WINDOWS:
+                m = self.pm_averages.mean(kind, w)
+                averages[f"{kind}_{w}"] = None if m is None else round(m, 1)
+        change = self.tendency.change_3h()
+        self.api.publish(now, readings, averages=averages,
+                         pressure_change_3h=None if change is None else round(change, 1),
+                         pressure_tendency=self.tendency.text(),
+                         devices={name: {k: (round(v, 2) if isinstance(v, float) else v) for k, v in row.items()}
+                                  for name, row in extra.items()})
+
+    def close(self) -> None:
+        self.hub.stop(timeout=3.0)
+        if self.bbc is not None:
+            self.bbc.stop()
+        if self.api is not None:
+            self.api.stop()
+        if self.uplink is not None:
+            self.uplink.stop()  # spools the tail; it's sent on the next run
+        self.store.close()
+        for store in self.device_stores.values():
+            store.close()
+        for log in self.raw_logs.values():
+            log.close()
+        self.hub.close()
+        for sim in self.sims:
+            sim.stop()
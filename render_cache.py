@@ -0,0 +1,187 @@
+import json
+import os
+from collections import OrderedDict
+
+import pygame
+
+FONT_CACHE = os.path.expanduser("~/.cache/airquality/fonts.json")
+
+
+class FontCache:
+    """
+    pygame.font.SysFont() walks the system font list (fc-list on Linux) on
+    first use, which is a good chunk of startup on a Pi. This remembers the
+    resolved file for each family name on disk, so later runs go straight
+    to pygame.font.Font(path). Font objects are shared per (path, size).
+    A cached path that has since disappeared is simply resolved again.
+    """
+
+    def __init__(self, path: str = FONT_CACHE):
+        self.path = path
+        self._paths = {}
+        self._fonts = {}
+        self._dirty = False
+        if path:
+            try:
+                with open(path) as f:
+                    self._paths = json.load(f)
+            except Exception:
+                self._paths = {}
+
+    def _resolve(self, name: str, bold: bool, italic: bool):
+        key = f"{name}|{int(bold)}{int(italic)}"
+        path = self._paths.get(key)
+        if path and os.path.exists(path):
+            return path
+        path = pygame.font.match_font(name, bold, italic)  # the slow bit
+        if path:
+            self._paths[key] = path
+            self._dirty = True
+        return path
+
+    def font(self, name: str, size: int, bold: bool = False, italic: bool = False):
+        """Same result as SysFont(name, size): falls back to pygame's default font."""
+        path = self._resolve(name, bold, italic)
+        key = (path, size)
+        f = self._fonts.get(key)
+        if f is None:
+            f = pygame.font.Font(path, size)
+            self._fonts[key] = f
+        return f
+
+    def save(self) -> None:
+        if not self.path or not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._paths, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except OSError:
+            pass
+
+
+class TextCache:
+    """
+    Bounded LRU cache of rendered text surfaces keyed by (font, text, colour).
+    Antialiased font.render at 60pt+ is the most expensive thing we do per
+    frame on a Pi, and almost all of it is the same strings again and again.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text: str, colour):
+        key = (font, text, colour)
+        surf = self._cache.get(key)
+        if surf is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return surf
+
+        self.misses += 1
+        surf = font.render(text, True, colour)
+        self._cache[key] = surf
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return surf
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+class Compositor:
+    """
+    Region-based redraw. Each widget is registered under a key with a token
+    describing its content; if the token hasn't changed since last frame the
+    widget is skipped. Changed widgets are cleared, re-blitted, and only
+    their rects are pushed with pygame.display.update().
+
+    background can be a colour or a Surface the size of the screen (e.g. a
+    pre-rendered static layer); cleared areas are restored from it.
+    """
+
+    def __init__(self, screen, background=(0, 0, 0), text_cache: TextCache = None):
+        self.screen = screen
+        self.background = background
+        self.text_cache = text_cache or TextCache()
+
+        self._items = {}   # key -> (token, surface, rect)
+        self._dirty = []
+        self._full = True  # first frame is always a full redraw
+
+    def invalidate(self) -> None:
+        """Force a full-screen redraw on the next flush()."""
+        self._full = True
+
+    def put(self, key, token, make_surface, **anchor):
+        """
+        Place a widget. make_surface() is only called when token changed.
+        anchor is any pygame.Rect position keyword (topleft=, topright=, ...).
+        Returns the widget's rect.
+        """
+        token = (token, tuple(anchor.items()))
+        old = self._items.get(key)
+        if old is not None and old[0] == token:
+            return old[2]
+
+        surf = make_surface()
+        rect = surf.get_rect(**anchor)
+        self._items[key] = (token, surf, rect)
+
+        if not self._full:
+            if old is not None:
+                self._dirty.append(old[2])
+            self._dirty.append(rect)
+        return rect
+
+    def text(self, key, font, text: str, colour, **anchor):
+        """put() for a single line of text, rendered through the text cache."""
+        return self.put(
+            key, (font, text, colour),
+            lambda: self.text_cache.render(font, text, colour),
+            **anchor
+        )
+
+    def remove(self, key) -> None:
+        old = self._items.pop(key, None)
+        if old is not None and not self._full:
+            self._dirty.append(old[2])
+
+    def _clear(self, rect) -> None:
+        if isinstance(self.background, pygame.Surface):
+            self.screen.blit(self.background, rect, rect)
+        else:
+            self.screen.fill(self.background, rect)
+
+    def flush(self):
+        """Draw pending changes and push them to the display. Returns the rects updated."""
+        if self._full:
+            self._full = False
+            self._dirty = []
+            self._clear(self.screen.get_rect())
+            for _, surf, rect in self._items.values():
+                self.screen.blit(surf, rect)
+            pygame.display.flip()
+            return [self.screen.get_rect()]
+
+        if not self._dirty:
+            return []
+
+        dirty = self._dirty
+        self._dirty = []
+        for r in dirty:
+            self._clear(r)
+
+        # re-blit anything touching a cleared area (overlapping neighbours included)
+        for _, surf, rect in self._items.values():
+            if rect.collidelist(dirty) != -1:
+                self.screen.blit(surf, rect)
+
+        pygame.display.update(dirty)
+        return dirty
@@ -0,0 +1,66 @@
+import time
+
+import pygame
+
+
+class RedrawScheduler:
+    """
+    Sleeps until there is something worth drawing instead of ticking at a
+    fixed FPS. The loop wakes on:
+      - notify() from a worker (new sensor snapshot, weather refresh)
+      - the next wall-clock second boundary (the on-screen clock)
+      - user input / window events
+    Everything else (mouse motion etc.) is blocked at the SDL level so it
+    doesn't cause wakeups.
+
+    coalesce_ms: after a notify() wake, wait this long and drain the queue so a
+    burst of updates from several workers turns into a single redraw.
+    """
+
+    WAKE_EVENTS = (
+        pygame.QUIT,
+        pygame.KEYDOWN,
+        pygame.MOUSEBUTTONDOWN,
+        pygame.WINDOWEXPOSED,
+        pygame.VIDEOEXPOSE,
+    )
+
+    def __init__(self, coalesce_ms: int = 50):
+        self.coalesce_ms = coalesce_ms
+        self.event_type = pygame.event.custom_type()
+        self.wakeups = 0
+        self.timer_wake = False  # True if the last wait() ended on the clock tick
+
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(list(self.WAKE_EVENTS) + [self.event_type])
+
+    def notify(self, *_args) -> None:
+        """Thread-safe: request a redraw. Signature fits on_update callbacks."""
+        try:
+            pygame.event.post(pygame.event.Event(self.event_type))
+        except pygame.error:
+            pass  # display already shut down
+
+    @staticmethod
+    def _ms_to_next_second() -> int:
+        now = time.time()
+        return max(1, int((1.0 - (now % 1.0)) * 1000) + 1)
+
+    def wait(self):
+        """
+        Block until the next reason to redraw. Returns the pygame events that
+        arrived (notify events are filtered out), possibly empty on a timer wake.
+        """
+        timeout = self._ms_to_next_second()
+        ev = pygame.event.wait(timeout)
+        self.wakeups += 1
+        self.timer_wake = ev.type == pygame.NOEVENT
+        if self.timer_wake:
+            return []
+
+        if ev.type == self.event_type and self.coalesce_ms:
+            # don't coalesce past the clock tick, it would show a late second
+            pygame.time.wait(min(self.coalesce_ms, self._ms_to_next_second() - 1))
+
+        events = [ev] + pygame.event.get()
+        return [e for e in events if e.type != self.event_type]
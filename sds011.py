@@ -1,28 +1,125 @@
 import serial
+from dataclasses import dataclass
+from typing import List, Optional
+
+FRAME_LEN = 10
+FRAME_HEADER = b"\xaa\xc0"  # AA C0 starts every data frame
+FRAME_TAIL = 0xAB
+
+
+@dataclass(frozen=True)
+class SDS011Frame:
+    pm25: float
+    pm10: float
+    device_id: int  # ID1 | ID2 << 8, as printed on the sensor
+
+
+class SDS011FrameParser:
+    """
+    Streaming frame parser. Feed it whatever bytes arrived; it scans for
+    frame boundaries, checks tail + checksum and keeps any trailing partial
+    frame for the next call. One dropped byte costs one frame, not a long
+    misaligned run.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+
+        # counters (monotonic, for diagnostics/metrics)
+        self.frames_ok = 0
+        self.bad_frames = 0      # header found but tail/checksum wrong
+        self.skipped_bytes = 0   # junk discarded while resyncing
+        self.dropped_frames = 0  # valid frames superseded by a newer one
+
+    @property
+    def pending(self) -> int:
+        return len(self._buf)
+
+    def feed(self, data: bytes) -> List[SDS011Frame]:
+        buf = self._buf
+        buf += data
+        frames = []
+
+        i = 0
+        n = len(buf)
+        while True:
+            j = buf.find(FRAME_HEADER, i)
+            if j < 0:
+                # keep a lone trailing AA, it may be the start of the next header
+                keep_from = n - 1 if n and buf[-1] == FRAME_HEADER[0] else n
+                self.skipped_bytes += keep_from - i
+                i = keep_from
+                break
+
+            self.skipped_bytes += j - i
+            if n - j < FRAME_LEN:
+                i = j  # partial frame, wait for more bytes
+                break
+
+            chk = sum(buf[j + 2:j + 8]) & 0xFF
+            if buf[j + 9] != FRAME_TAIL or buf[j + 8] != chk:
+                self.bad_frames += 1
+                i = j + 1  # resync: look for the next header after this one
+                continue
+
+            frames.append(SDS011Frame(
+                pm25=(buf[j + 2] | (buf[j + 3] << 8)) / 10.0,
+                pm10=(buf[j + 4] | (buf[j + 5] << 8)) / 10.0,
+                device_id=buf[j + 6] | (buf[j + 7] << 8),
+            ))
+            i = j + FRAME_LEN
+
+        del buf[:i]
+        self.frames_ok += len(frames)
+        return frames
+
+    def stats(self) -> dict:
+        return {
+            "frames_ok": self.frames_ok,
+            "bad_frames": self.bad_frames,
+            "skipped_bytes": self.skipped_bytes,
+            "dropped_frames": self.dropped_frames,
+        }
+
 
 class SDS011:
+    """
+    port is a device path or any pyserial URL (e.g. "loop://" for in-memory
+    benchmarks, "socket://host:port" for a sensor on another machine).
+    """
     def __init__(self, port: str, baudrate: int = 9600, timeout: float = 2.0):
-        self.ser = serial.Serial(port, baudrate=baudrate, timeout=timeout)
+        self.ser = serial.serial_for_url(port, baudrate=baudrate, timeout=timeout)
+        self.parser = SDS011FrameParser()
 
-    def read(self):
+    def read_all(self) -> List[SDS011Frame]:
         """
-        Returns (pm25, pm10) floats in µg/m³, or None if no valid frame.
+        Every valid frame currently available, oldest first.
+        Drains the OS buffer in one read, blocking (up to timeout) only for
+        as many bytes as are needed to complete a frame.
         Frame: AA C0 PM25_L PM25_H PM10_L PM10_H ID1 ID2 CHK AB
         """
-        data = self.ser.read(10)
-        if len(data) != 10:
-            return None
-        if data[0] != 0xAA or data[1] != 0xC0 or data[9] != 0xAB:
-            return None
+        want = max(self.ser.in_waiting, FRAME_LEN - self.parser.pending)
+        data = self.ser.read(want)
+        if not data:
+            return []
+        return self.parser.feed(data)
 
-        pm25 = (data[2] + data[3] * 256) / 10.0
-        pm10 = (data[4] + data[5] * 256) / 10.0
-
-        chk = (sum(data[2:8]) % 256)
-        if chk != data[8]:
+    def read_frame(self) -> Optional[SDS011Frame]:
+        """Newest valid frame (latest wins, older queued frames are dropped)."""
+        frames = self.read_all()
+        if not frames:
             return None
+        self.parser.dropped_frames += len(frames) - 1
+        return frames[-1]
 
-        return (pm25, pm10)
+    def read(self):
+        """
+        Returns (pm25, pm10) floats in µg/m³, or None if no valid frame.
+        """
+        f = self.read_frame()
+        if f is None:
+            return None
+        return (f.pm25, f.pm10)
 
     def close(self):
         try:
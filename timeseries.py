@@ -0,0 +1,417 @@
+import math
+import mmap
+import os
+import threading
+from array import array
+from typing import Dict, Optional, Sequence, Tuple
+
+# Default channel set, in record order.
+CHANNELS = ("pm25", "pm10", "temp_in", "humidity", "pressure", "temp_out")
+
+# (name, bucket seconds, capacity in records)
+# raw ~4.8MB, 1m ~1.0MB, 15m ~3.7MB, 1h ~4.6MB (~14.1MB in all) with the default 6 channels
+DEFAULT_TIERS = (
+    ("raw", 1, 2 * 86400),        # 2 days of 1 Hz samples
+    ("1m", 60, 7 * 1440),         # a week of minutes
+    ("15m", 900, 366 * 96),       # a year of quarter hours
+    ("1h", 3600, 5 * 366 * 24),   # five years of hours
+)
+
+STATS = ("min", "mean", "max")
+
+MAGIC = 0x53545141  # b"AQTS"
+VERSION = 1
+# header words: magic, version, width, capacity, head, count, bucket_seconds, n_channels
+HEADER_WORDS = 8
+H_HEAD, H_COUNT = 4, 5
+
+NAN = float("nan")
+
+
+class RingFile:
+    """
+    Fixed-record ring buffer living in a memory-mapped file.
+
+    Every record is `width` 32-bit words. Word 0 is the uint32 timestamp
+    (epoch seconds, or bucket start for rollups); the remaining words are read
+    through a float32 view of the same buffer, except where a caller chooses to
+    use the uint32 view (rollup sample counts). No per-record Python objects:
+    appends write straight into the map and queries copy strided slices.
+    """
+
+    def __init__(self, path: str, width: int, capacity: int, bucket_seconds: int, n_channels: int):
+        self.path = path
+        self.width = width
+        self.capacity = capacity
+
+        size = (HEADER_WORDS + width * capacity) * 4
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if not exists:
+                os.ftruncate(fd, size)
+            elif os.path.getsize(path) != size:
+                raise ValueError(f"{path}: size mismatch, delete it or use the original tier settings")
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        self._u = memoryview(self._mm).cast("I")
+        self._f = memoryview(self._mm).cast("f")
+
+        u = self._u
+        if not exists:
+            u[0:HEADER_WORDS] = array("I", [MAGIC, VERSION, width, capacity, 0, 0, bucket_seconds, n_channels])
+        elif (u[0], u[1], u[2], u[3], u[6], u[7]) != (MAGIC, VERSION, width, capacity, bucket_seconds, n_channels):
+            self.close()
+            raise ValueError(f"{path}: header does not match this store layout")
+
+    def __len__(self) -> int:
+        return self._u[H_COUNT]
+
+    def _base(self, i: int) -> int:
+        """Word offset of logical record i (0 = oldest)."""
+        count = self._u[H_COUNT]
+        slot = (self._u[H_HEAD] - count + i) % self.capacity
+        return HEADER_WORDS + slot * self.width
+
+    def append(self, ts: int, values, counts_word: Optional[int] = None, counts=None) -> None:
+        """
+        values fill words 1.. as float32; counts_word (if given) goes to word 1
+        as uint32, and counts (a uint32 array, if given) fill the last words.
+        """
+        u = self._u
+        head = u[H_HEAD]
+        base = HEADER_WORDS + head * self.width
+        end = base + self.width
+
+        u[base] = int(ts)
+        if counts is not None:
+            end -= len(counts)
+            u[end:end + len(counts)] = counts
+        if counts_word is None:
+            self._f[base + 1:end] = values
+        else:
+            u[base + 1] = counts_word
+            self._f[base + 2:end] = values
+
+        u[H_HEAD] = (head + 1) % self.capacity
+        if u[H_COUNT] < self.capacity:
+            u[H_COUNT] += 1
+
+    def extend(self, records) -> None:
+        """
+        Append many whole records at once. records: anything exposing the
+        buffer protocol (bytes, array, a C-contiguous NumPy array) holding
+        `width` 32-bit words per record. At most two copies into the map.
+        """
+        data = memoryview(records).cast("B")
+        rec = self.width * 4
+        n = len(data) // rec
+        if n > self.capacity:
+            data = data[(n - self.capacity) * rec:]
+            n = self.capacity
+
+        u = self._u
+        head = u[H_HEAD]
+        first = min(n, self.capacity - head)
+        base = (HEADER_WORDS + head * self.width) * 4
+        self._mm[base:base + first * rec] = data[:first * rec]
+        if n > first:
+            start = HEADER_WORDS * 4
+            self._mm[start:start + (n - first) * rec] = data[first * rec:n * rec]
+
+        u[H_HEAD] = (head + n) % self.capacity
+        u[H_COUNT] = min(self.capacity, u[H_COUNT] + n)
+
+    def timestamp(self, i: int) -> int:
+        return self._u[self._base(i)]
+
+    def last_timestamp(self) -> Optional[int]:
+        n = len(self)
+        return self.timestamp(n - 1) if n else None
+
+    def bisect(self, t: float) -> int:
+        """First logical index whose timestamp is >= t."""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _segments(self, i0: int, i1: int):
+        """Physical [start, end) slot ranges covering logical records i0..i1."""
+        if i0 >= i1:
+            return []
+        start = (self._u[H_HEAD] - len(self) + i0) % self.capacity
+        n = i1 - i0
+        if start + n <= self.capacity:
+            return [(start, start + n)]
+        return [(start, self.capacity), (0, start + n - self.capacity)]
+
+    def column(self, i0: int, i1: int, word: int, typecode: str = "f") -> array:
+        """Copy one word of records i0..i1 out as a compact array."""
+        view = self._f if typecode == "f" else self._u
+        out = array(typecode)
+        w = self.width
+        for s, e in self._segments(i0, i1):
+            a = HEADER_WORDS + s * w + word
+            out.frombytes(view[a:HEADER_WORDS + e * w:w].tobytes())
+        return out
+
+    def records(self, i0: int, i1: int) -> array:
+        """Raw float32 words for records i0..i1 (row-major, width per row)."""
+        out = array("f")
+        w = self.width
+        for s, e in self._segments(i0, i1):
+            out.frombytes(self._f[HEADER_WORDS + s * w:HEADER_WORDS + e * w].tobytes())
+        return out
+
+    def flush(self) -> None:
+        self._mm.flush()
+
+    def close(self) -> None:
+        try:
+            self._u.release()
+            self._f.release()
+            self._mm.close()
+        except Exception:
+            pass
+
+
+class _Rollup:
+    """Running min/sum/max (and non-NaN count) per channel for the current bucket of one tier."""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.bucket = None
+        self.samples = 0
+        self.mins = array("d", [math.inf] * n)
+        self.maxs = array("d", [-math.inf] * n)
+        self.sums = array("d", [0.0] * n)
+        self.counts = array("I", [0] * n)
+
+    def reset(self, bucket: int) -> None:
+        self.bucket = bucket
+        self.samples = 0
+        for k in range(self.n):
+            self.mins[k] = math.inf
+            self.maxs[k] = -math.inf
+            self.sums[k] = 0.0
+            self.counts[k] = 0
+
+    def add(self, values: Sequence[float]) -> None:
+        self.samples += 1
+        for k, v in enumerate(values):
+            if v != v:  # NaN = missing
+                continue
+            if v < self.mins[k]:
+                self.mins[k] = v
+            if v > self.maxs[k]:
+                self.maxs[k] = v
+            self.sums[k] += v
+            self.counts[k] += 1
+
+    def row(self) -> array:
+        out = array("f")
+        for k in range(self.n):
+            c = self.counts[k]
+            if c:
+                out.extend((self.mins[k], self.sums[k] / c, self.maxs[k]))
+            else:
+                out.extend((NAN, NAN, NAN))
+        return out
+
+
+def rollup_width(n: int) -> int:
+    """
+    Rollup record: timestamp, rows in the bucket (uint32), min/mean/max per
+    channel, then per channel the rows that had a value (uint32), which is
+    what its mean is over.
+    """
+    return 2 + 4 * n
+
+
+def _upgrade_rollup(path: str, capacity: int, bucket_seconds: int, n: int) -> None:
+    """
+    Rewrite a rollup file from before the per-channel counts (2 + 3n words a
+    record) in the current layout. Old buckets get the row count for every
+    channel that has a mean, 0 for the rest: the best guess there is.
+    """
+    old_width = 2 + 3 * n
+    if not os.path.exists(path) or os.path.getsize(path) != (HEADER_WORDS + old_width * capacity) * 4:
+        return
+    old = RingFile(path, old_width, capacity, bucket_seconds, n)
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    new = RingFile(tmp, rollup_width(n), capacity, bucket_seconds, n)
+    try:
+        words = old.records(0, len(old))
+        bits = array("I", words.tobytes())
+        mean = STATS.index("mean")
+        for r in range(len(old)):
+            row = words[r * old_width:(r + 1) * old_width]
+            samples = bits[r * old_width + 1]
+            counts = array("I", (samples if row[2 + 3 * k + mean] == row[2 + 3 * k + mean] else 0
+                                 for k in range(n)))
+            new.append(bits[r * old_width], row[2:], counts_word=samples, counts=counts)
+        new.flush()
+    finally:
+        old.close()
+        new.close()
+    os.replace(tmp, path)
+
+
+class TimeSeriesStore:
+    """
+    Append-only store for all readings: raw 1 Hz samples plus automatically
+    maintained rollups (min/mean/max and sample count per channel) in one ring
+    file per tier; rollup files in the older layout are upgraded on open.
+
+    Missing values are stored as NaN. A partially filled rollup bucket is
+    rebuilt from the raw tier on reopen, so restarts don't leave holes.
+
+    Timestamps only go forward: a row at or before the last stored one is
+    dropped (a Pi has no RTC, so its clock can step back at boot until NTP
+    syncs), because bisect() and the rollups rely on that order.
+
+    Thread safe: one writer (the acquisition loop) and any number of readers
+    (API handlers) share a lock, since an append rewrites a slot before it
+    moves the head and an unlocked reader could see a torn record. Readers on
+    other threads use query(), counts() and last_timestamp(), not self.tiers.
+    """
+
+    def __init__(self, directory: str, channels: Sequence[str] = CHANNELS, tiers=DEFAULT_TIERS):
+        self.directory = directory
+        self.channels = tuple(channels)
+        self._index = {c: k for k, c in enumerate(self.channels)}
+        n = len(self.channels)
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.tiers: Dict[str, RingFile] = {}
+        self.bucket_seconds: Dict[str, int] = {}
+        self._rollups = []  # (name, bucket_seconds, RingFile, _Rollup)
+
+        for name, bucket, capacity in tiers:
+            path = os.path.join(directory, f"{name}.ring")
+            if bucket == 1:
+                width = 1 + n
+            else:
+                width = rollup_width(n)
+                _upgrade_rollup(path, capacity, bucket, n)
+            ring = RingFile(path, width, capacity, bucket, n)
+            self.tiers[name] = ring
+            self.bucket_seconds[name] = bucket
+            if bucket != 1:
+                self._rollups.append((name, bucket, ring, _Rollup(n)))
+
+        # last second already covered by any tier (a stored rollup covers its whole bucket)
+        self._last_ts = max((ring.last_timestamp() + self.bucket_seconds[name] - 1
+                             for name, ring in self.tiers.items() if len(ring)), default=-1)
+        self.dropped = 0  # rows refused for going backwards in time
+        self._recover()
+
+    def _recover(self) -> None:
+        raw = self.tiers.get("raw")
+        if raw is None or not len(raw):
+            return
+        for name, bucket, ring, acc in self._rollups:
+            last_raw = raw.last_timestamp()
+            current = last_raw - last_raw % bucket
+            done = ring.last_timestamp()
+            if done is not None and done >= current:
+                continue
+            acc.reset(current)
+            i0 = raw.bisect(current)
+            rows = raw.records(i0, len(raw))
+            w = raw.width
+            for r in range(len(rows) // w):
+                acc.add(rows[r * w + 1:(r + 1) * w])
+
+    def _row(self, values) -> array:
+        if isinstance(values, dict):
+            row = array("f", [NAN] * len(self.channels))
+            for c, v in values.items():
+                if v is not None:
+                    row[self._index[c]] = v
+            return row
+        return array("f", (NAN if v is None else v for v in values))
+
+    def append(self, ts: float, values) -> bool:
+        """
+        values: dict channel -> float/None, or a sequence in channel order.
+        Returns False (and stores nothing) if ts isn't after the last row.
+        """
+        ts = int(ts)
+        row = self._row(values)
+        with self._lock:
+            if ts <= self._last_ts:
+                self.dropped += 1
+                return False
+            self._last_ts = ts
+
+            raw = self.tiers.get("raw")
+            if raw is not None:
+                raw.append(ts, row)
+
+            for name, bucket, ring, acc in self._rollups:
+                b = ts - ts % bucket
+                if acc.bucket != b:
+                    if acc.bucket is not None and acc.samples:
+                        ring.append(acc.bucket, acc.row(), counts_word=acc.samples, counts=acc.counts)
+                    acc.reset(b)
+                acc.add(row)
+        return True
+
+    def last_timestamp(self, tier: str) -> Optional[int]:
+        """Timestamp (bucket start for rollups) of a tier's newest record, or None."""
+        with self._lock:
+            return self.tiers[tier].last_timestamp()
+
+    def query(self, channel: str, t0: float, t1: float, tier: str = "raw",
+              stat: str = "mean") -> Tuple[array, array]:
+        """
+        Records with t0 <= timestamp < t1 for one channel.
+        Returns (timestamps array('I'), values array('f')). For rollup tiers
+        stat picks min / mean / max.
+        """
+        ring = self.tiers[tier]
+        ch = self._index[channel]
+        if self.bucket_seconds[tier] == 1:
+            word = 1 + ch
+        else:
+            word = 2 + ch * 3 + STATS.index(stat)
+
+        with self._lock:
+            i0 = ring.bisect(t0)
+            i1 = ring.bisect(t1)
+            return ring.column(i0, i1, 0, "I"), ring.column(i0, i1, word)
+
+    def counts(self, channel: str, t0: float, t1: float, tier: str) -> Tuple[array, array]:
+        """
+        (timestamps, samples per bucket) for one channel of a rollup tier: the
+        rows where it had a value, i.e. the weights for its means.
+        """
+        ring = self.tiers[tier]
+        word = 2 + 3 * len(self.channels) + self._index[channel]
+        with self._lock:
+            i0 = ring.bisect(t0)
+            i1 = ring.bisect(t1)
+            return ring.column(i0, i1, 0, "I"), ring.column(i0, i1, word, "I")
+
+    def flush(self) -> None:
+        for ring in self.tiers.values():
+            ring.flush()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            for ring in self.tiers.values():
+                ring.close()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Pushes readings to a central collector in compressed batches.
+
+The display loop only calls enqueue(), which appends to an in-memory deque.
+A background thread cuts a batch every `batch_seconds`, writes it to the
+spool directory as a gzip'd NDJSON file (one reading per line), and then
+tries to ship everything in the spool, oldest first. Several spool files go
+out in one request: concatenated gzip members are still one valid gzip
+stream, so after an outage the backlog is sent in bulk without
+recompressing. A file is deleted only after the collector answers 2xx, so
+a dead network or a reboot loses nothing (up to max_spool_bytes).
+
+Transports:
+    http(s)://host/path   POST, Content-Encoding: gzip, one pooled requests.Session
+    mqtt://host[:port]/topic  one publish per request (needs paho-mqtt)
+
+Local stand-in collector for testing:
+    python3 uplink.py --serve 8081      # prints every reading it receives
+"""
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+
+from metrics import REGISTRY
+
+SENT = REGISTRY.counter("aq_uplink_requests_total", "Uplink requests", labels={"result": "ok"})
+FAILED = REGISTRY.counter("aq_uplink_requests_total", labels={"result": "error"})
+DROPPED = REGISTRY.counter("aq_uplink_dropped_batches_total", "Spool files discarded because the spool was full")
+
+
+class HttpTransport:
+    def __init__(self, url: str, timeout: float = 10.0, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers.update({
+            "Content-Type": "application/x-ndjson",
+            "Content-Encoding": "gzip",
+        })
+        if headers:
+            self._session.headers.update(headers)
+
+    def send(self, body: bytes) -> bool:
+        r = self._session.post(self.url, data=body, timeout=self.timeout)
+        return 200 <= r.status_code < 300
+
+    def close(self) -> None:
+        self._session.close()
+
+
+class MqttTransport:
+    """Publishes the gzip'd batch as one QoS 1 message. paho-mqtt is optional."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        import paho.mqtt.publish as publish  # only needed for mqtt:// uplinks
+        u = urlsplit(url)
+        self._publish = publish
+        self.host = u.hostname
+        self.port = u.port or 1883
+        self.topic = u.path.lstrip("/") or "airquality"
+        self.timeout = timeout
+
+    def send(self, body: bytes) -> bool:
+        self._publish.single(self.topic, body, qos=1, hostname=self.host, port=self.port,
+                             keepalive=int(self.timeout) + 5)
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+def make_transport(url: str, timeout: float = 10.0):
+    if url.startswith("mqtt://"):
+        return MqttTransport(url, timeout)
+    return HttpTransport(url, timeout)
+
+
+class Uplink:
+    def __init__(self, url: str, spool_dir: str, device_id: str, batch_seconds: float = 60.0,
+                 max_request_bytes: int = 256 * 1024, max_spool_bytes: int = 50 * 1024 * 1024,
+                 retry_seconds: float = 30.0, max_backoff_seconds: float = 1800.0,
+                 timeout: float = 10.0, transport=None):
+        self.device_id = device_id
+        self.spool_dir = spool_dir
+        self.batch_seconds = batch_seconds
+        self.max_request_bytes = max_request_bytes
+        self.max_spool_bytes = max_spool_bytes
+        self.retry_seconds = retry_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.transport = transport or make_transport(url, timeout)
+
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self._pending = deque()  # (ts, readings); append/popleft are thread-safe
+        self._seq = 0
+        self._next_send = 0.0
+        self.failures = 0
+        self.last_success = None
+
+        self._thread = None
+        self._stop = threading.Event()
+
+        REGISTRY.func("aq_uplink_spool_files", lambda: len(self._spooled()),
+                      help="Batches waiting in the spool")
+
+    # --- called from the display loop ---
+    def enqueue(self, ts: float, readings: dict) -> None:
+        self._pending.append((int(ts), readings))
+
+    # --- spool ---
+    def _spooled(self):
+        try:
+            names = [n for n in os.listdir(self.spool_dir) if n.endswith(".ndjson.gz")]
+        except OSError:
+            return []
+        return sorted(names)  # zero-padded timestamp prefix -> oldest first
+
+    def spool_batch(self) -> bool:
+        """Move everything enqueued so far into one spool file. Returns False if there was nothing."""
+        lines = []
+        first_ts = None
+        while self._pending:
+            ts, readings = self._pending.popleft()
+            if first_ts is None:
+                first_ts = ts
+            doc = {"device": self.device_id, "ts": ts}
+            for k, v in readings.items():
+                doc[k] = round(v, 2) if isinstance(v, float) else v
+            lines.append(json.dumps(doc, separators=(",", ":")))
+        if not lines:
+            return False
+
+        self._seq += 1
+        name = f"{first_ts:010d}-{os.getpid()}-{self._seq:06d}.ndjson.gz"
+        tmp = os.path.join(self.spool_dir, "." + name)
+        with open(tmp, "wb") as f:
+            f.write(gzip.compress(("\n".join(lines) + "\n").encode(), compresslevel=6))
+        os.replace(tmp, os.path.join(self.spool_dir, name))
+        self._trim_spool()
+        return True
+
+    def _trim_spool(self) -> None:
+        names = self._spooled()
+        sizes = []
+        for n in names:
+            try:
+                sizes.append(os.path.getsize(os.path.join(self.spool_dir, n)))
+            except OSError:
+                sizes.append(0)
+        total = sum(sizes)
+        i = 0
+        while total > self.max_spool_bytes and i < len(names) - 1:
+            try:
+                os.remove(os.path.join(self.spool_dir, names[i]))
+                DROPPED.inc()
+            except OSError:
+                pass
+            total -= sizes[i]
+            i += 1
+
+    # --- sending ---
+    def _backoff_seconds(self) -> float:
+        delay = min(self.retry_seconds * (2 ** (self.failures - 1)), self.max_backoff_seconds)
+        return delay * random.uniform(0.8, 1.2)
+
+    def send_spool(self) -> int:
+        """Ship spooled batches, several per request. Returns files sent; stops at the first failure."""
+        sent = 0
+        names = self._spooled()
+        while names:
+            body = bytearray()
+            chunk = []
+            for n in names:
+                try:
+                    with open(os.path.join(self.spool_dir, n), "rb") as f:
+                        data = f.read()
+                except OSError:
+                    continue
+                if chunk and len(body) + len(data) > self.max_request_bytes:
+                    break
+                body += data
+                chunk.append(n)
+            if not chunk:
+                break
+
+            try:
+                ok = self.transport.send(bytes(body))
+            except Exception:
+                ok = False
+            if not ok:
+                FAILED.inc()
+                self.failures += 1
+                self._next_send = time.time() + self._backoff_seconds()
+                return sent
+
+            SENT.inc()
+            for n in chunk:
+                try:
+                    os.remove(os.path.join(self.spool_dir, n))
+                except OSError:
+                    pass
+            sent += len(chunk)
+            names = self._spooled()
+
+        self.failures = 0
+        self.last_success = time.time()
+        self._next_send = 0.0
+        return sent
+
+    # --- background thread ---
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="uplink", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.batch_seconds):
+            try:
+                self.spool_batch()
+                if time.time() >= self._next_send:
+                    self.send_spool()
+            except Exception:
+                pass  # disk full etc.; try again next batch
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Spools whatever is still in memory; sending resumes on the next start."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        try:
+            self.spool_batch()
+        except Exception:
+            pass
+        self.transport.close()
+
+
+# ---------- local stand-in collector ----------
+
+def serve(port: int, host: str = "127.0.0.1"):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)  # handles concatenated members
+            lines = body.decode().splitlines()
+            for line in lines:
+                print(line)
+            print(f"# {len(lines)} readings from {self.client_address[0]}", flush=True)
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    print(f"collector on http://{host}:{port}/")
+    ThreadingHTTPServer((host, port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Stand-in telemetry collector")
+    ap.add_argument("--serve", type=int, default=8081, metavar="PORT")
+    ap.add_argument("--host", default="127.0.0.1")
+    args = ap.parse_args()
+    serve(args.serve, args.host)